@@ -0,0 +1,272 @@
+import collections
+import itertools
+import json
+import math
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from primality import bpsw
+from sieve import interval_search
+
+
+def product_level(nodes):
+    """
+    Utility function that computes the next level of a product tree.
+
+    :param nodes: a list of integers representing a level of the tree.
+    :return: a list holding the product of every pair of consecutive nodes, the last node is kept as is if the
+    level has an odd length.
+    """
+
+    return [nodes[i] * nodes[i + 1] if i + 1 < len(nodes) else nodes[i] for i in range(0, len(nodes), 2)]
+
+
+def remainder_level(parents, nodes):
+    """
+    Utility function that computes the next level of a remainder tree.
+
+    :param parents: a list of integers representing the remainders of the parents of the nodes.
+    :param nodes: a list of integers representing a level of the product tree, starting at an even position.
+    :return: a list holding the remainder of every node's parent modulo the square of the node.
+    """
+
+    return [parents[i // 2] % (node * node) for i, node in enumerate(nodes)]
+
+
+def leaf_gcds(moduli, remainders):
+    """
+    Utility function that extracts the shared factor of every modulus from the leaves of the remainder tree.
+
+    :param moduli: a list of integers representing the moduli.
+    :param remainders: a list of integers representing (product of all moduli) mod N_i^2 for every modulus.
+    :return: a list holding gcd(N_i, (product of all other moduli) mod N_i) for every modulus.
+    """
+
+    return [math.gcd(N, r // N) for N, r in zip(moduli, remainders)]
+
+
+def batch_gcd(moduli):
+    """
+    Implements Bernstein's batch GCD in memory: finds, for every modulus, its gcd with the product of all others.
+
+    :param moduli: a list of integers representing the moduli.
+    :return: a list of the same length, where an entry other than 1 is a factor shared with another modulus.
+    """
+
+    if not moduli:
+        return []
+    # Product tree: from the moduli up to their product.
+    tree = [list(moduli)]
+    while len(tree[-1]) > 1:
+        tree.append(product_level(tree[-1]))
+    # Remainder tree: from the product back down to the moduli.
+    remainders = tree.pop()
+    while tree:
+        remainders = remainder_level(remainders, tree.pop())
+    return leaf_gcds(moduli, remainders)
+
+
+def write_level(path, values):
+    """
+    Utility function that writes a level of a tree to disk as length-prefixed big-endian integers.
+
+    :param path: a string representing the path of the level file.
+    :param values: an iterable of lists of non negative integers.
+    :return: an integer representing the number of integers written.
+    """
+
+    count = 0
+    with open(path, "wb") as f:
+        for chunk in values:
+            for value in chunk:
+                data = value.to_bytes((value.bit_length() + 7) // 8, "big")
+                f.write(len(data).to_bytes(8, "big"))
+                f.write(data)
+            count += len(chunk)
+    return count
+
+
+def read_level(path, chunk_size):
+    """
+    Utility function that reads a level of a tree back from disk in chunks.
+
+    :param path: a string representing the path of the level file.
+    :param chunk_size: an integer representing the number of integers per chunk.
+    :return: a generator of lists of at most chunk_size integers.
+    """
+
+    def values():
+        with open(path, "rb") as f:
+            while True:
+                header = f.read(8)
+                if not header:
+                    return
+                yield int.from_bytes(f.read(int.from_bytes(header, "big")), "big")
+
+    iterator = values()
+    while True:
+        chunk = list(itertools.islice(iterator, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def read_moduli(source, chunk_size):
+    """
+    Utility function that reads moduli, one per line in decimal or with a 0x prefix, in chunks.
+
+    :param source: a text file object.
+    :param chunk_size: an integer representing the number of moduli per chunk.
+    :return: a generator of lists of at most chunk_size integers.
+    """
+
+    iterator = (int(line.strip(), 0) for line in source if line.strip())
+    while True:
+        chunk = list(itertools.islice(iterator, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def parallel_map(executor, function, arguments, max_pending):
+    """
+    Utility function that applies a function to a stream of argument tuples on a pool, keeping the input order.
+
+    :param executor: the pool of processes.
+    :param function: a picklable function.
+    :param arguments: an iterable of argument tuples.
+    :param max_pending: an integer bounding the number of tasks in flight.
+    :return: a generator of the results, in the order of the arguments.
+    """
+
+    pending = collections.deque()
+    for args in arguments:
+        if len(pending) == max_pending:
+            yield pending.popleft().result()
+        pending.append(executor.submit(function, *args))
+    while pending:
+        yield pending.popleft().result()
+
+
+def batch_gcd_file(source, destination, workdir=None, processes=None, chunk_size=1024):
+    """
+    Implements Bernstein's batch GCD over a file of moduli, keeping the levels of both trees on disk.
+
+    Only a few chunks of every level are in memory at any time, every level is computed chunk by chunk over a pool
+    of processes, and each level file is deleted as soon as the level below it has been computed.
+
+    :param source: a string representing the path of the moduli, one per line.
+    :param destination: a string representing the path of the JSON-lines report of moduli with a shared factor.
+    :param workdir: a string representing the directory holding the tree levels, a temporary one by default.
+    :param processes: an integer representing the size of the pool, by default the number of cores.
+    :param chunk_size: an integer representing the number of nodes per task, rounded up to an even number.
+    :return: an integer representing the number of moduli that share a factor with another one.
+    """
+
+    chunk_size += chunk_size % 2
+    processes = processes or os.cpu_count() or 1
+    max_pending = 2 * processes
+    temporary = workdir is None
+    workdir = tempfile.mkdtemp() if temporary else workdir
+    os.makedirs(workdir, exist_ok=True)
+    level = lambda name, i: os.path.join(workdir, "{}{}.bin".format(name, i))
+
+    try:
+        with ProcessPoolExecutor(processes) as executor:
+            # Product tree, from the moduli up to their product.
+            with open(source) as f:
+                count = write_level(level("product", 0), read_moduli(f, chunk_size))
+            if count == 0:
+                open(destination, "w").close()
+                return 0
+            sizes = [count]
+            while sizes[-1] > 1:
+                chunks = ((chunk,) for chunk in read_level(level("product", len(sizes) - 1), chunk_size))
+                write_level(level("product", len(sizes)), parallel_map(executor, product_level, chunks, max_pending))
+                sizes.append((sizes[-1] + 1) // 2)
+
+            # Remainder tree, from the product back down to the moduli.
+            top = len(sizes) - 1
+            if top:
+                os.replace(level("product", top), level("remainder", top))
+            else:
+                # A single modulus is both the root and the only leaf.
+                shutil.copyfile(level("product", 0), level("remainder", 0))
+            for i in range(top - 1, -1, -1):
+                parents = read_level(level("remainder", i + 1), chunk_size // 2)
+                chunks = ((next(parents), nodes) for nodes in read_level(level("product", i), chunk_size))
+                write_level(level("remainder", i), parallel_map(executor, remainder_level, chunks, max_pending))
+                os.remove(level("remainder", i + 1))
+                if i > 0:
+                    os.remove(level("product", i))
+
+            # Leaves
+            chunks = zip(read_level(level("product", 0), chunk_size), read_level(level("remainder", 0), chunk_size))
+            weak = 0
+            with open(destination, "w") as output:
+                index = 0
+                for moduli, factors in zip(read_level(level("product", 0), chunk_size),
+                                           parallel_map(executor, leaf_gcds, chunks, max_pending)):
+                    for N, factor in zip(moduli, factors):
+                        if factor != 1:
+                            output.write(json.dumps({"index": index, "N": str(N), "factor": str(factor)}) + "\n")
+                            weak += 1
+                        index += 1
+            os.remove(level("product", 0))
+            os.remove(level("remainder", 0))
+            return weak
+    finally:
+        if temporary:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def generate_corpus(path, count=1000, length=256, shared=10):
+    """
+    Utility function that writes a corpus of random moduli in which some pairs of moduli share a prime.
+
+    :param path: a string representing the path of the corpus.
+    :param count: an integer representing the number of moduli.
+    :param length: an integer representing the bit-length of the primes.
+    :param shared: an integer representing the number of planted pairs of moduli that share a prime.
+    :return: a set of the indices of the moduli that share a prime.
+    """
+
+    moduli = [interval_search(length, bpsw) * interval_search(length, bpsw) for _ in range(count - shared)]
+    planted = set()
+    for _ in range(shared):
+        # Reuse one prime of an existing modulus, as a weak random number generator would.
+        i = random.randrange(len(moduli))
+        while moduli[i] in planted:
+            i = random.randrange(len(moduli))
+        prime = interval_search(length, bpsw)
+        moduli[i] = prime * interval_search(length, bpsw)
+        moduli.append(prime * interval_search(length, bpsw))
+        planted.update((moduli[i], moduli[-1]))
+    random.shuffle(moduli)
+    with open(path, "w") as f:
+        f.write("\n".join(str(N) for N in moduli) + "\n")
+    return {i for i, N in enumerate(moduli) if N in planted}
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 3:
+        # python batch_gcd.py moduli.txt report.jsonl
+        print("{} moduli share a factor.".format(batch_gcd_file(sys.argv[1], sys.argv[2])))
+        sys.exit()
+
+    directory = tempfile.mkdtemp()
+    corpus, report = os.path.join(directory, "moduli.txt"), os.path.join(directory, "report.jsonl")
+    expected = generate_corpus(corpus, count=2000, length=256, shared=5)
+
+    start = time.perf_counter()
+    weak = batch_gcd_file(corpus, report, chunk_size=128)
+    print("Scanned 2000 moduli in {:.3f} s, {} share a factor.".format(time.perf_counter() - start, weak))
+    with open(report) as f:
+        found = {json.loads(line)["index"] for line in f}
+    print("Every planted pair was found: {}".format(found == expected))
+    shutil.rmtree(directory)
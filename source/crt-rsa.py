@@ -1,94 +1,105 @@
+import collections
+import io
+import os
 import random
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 
+from csprng import odd_candidate, randrange
+from keystore import Key
+from mod_exp import FixedExponent
+from padding import capacity, oaep_decode, oaep_encode, read_blocks
+from primality import is_prime
+from sieve import SIEVE_BOUND, interval_search
 
-def n_bit_rand(n):
-    """
-    Utility function used to generate a random n-bit integer.
-
-    :param n: an integer representing the length (bitwise) of the integer to be produced.
-    :return: an integer of the desired length (bitwise).
-    """
 
-    return random.randrange(2 ** (n - 1) + 1, 2 ** n - 1)
-
-
-def miller_rabin(n):
+def get_prime(length, diff=0, bound=SIEVE_BOUND, search="interval", mode="tuned", rand=odd_candidate):
     """
-    Implements the Miller-Rabin primality test.
+    Utility function that produces a random prime of the desired length that is not equal to the parameter diff.
 
-    :param n: an integer that is going to be tested for primality.
-    :return: True if the given number is find to be prime, False otherwise.
+    :param length: an integer representing the desired length of the prime that will be returned by the function.
+    :param diff: a prime number that should not be returned by the function.
+    :param bound: an integer representing the bound of the small primes used for trial division.
+    :param search: "interval" to sieve whole intervals of candidates, "random" to draw every candidate anew.
+    :param mode: a string representing the primality mode, see is_prime.
+    :param rand: a function that returns a random odd candidate of the given length, see top_candidate.
+    :return: a random prime number
     """
 
-    # Find integers k, q, where k > 0, q odd, such that n - 1 = 2^k * q
-    k, q = 0, n - 1
-    while q % 2 == 0:
-        k += 1
-        q //= 2
-
-    # Pick a random integer a in the range (1, n-1) or [2, n-2]
-    a = random.randint(2, n - 2)
-
-    # if a^q mod n = 1 or n - 1 then return "inconclusive"
-    x = fast(int(a), int(q), int(n))
-    if x == 1 or x == n - 1:
-        return True
-
-    # for j = 0 to k - 1 do
-    for _ in range(k):
-        # if a^2jq mod n = n - 1 then return "inconclusive"
-        x = fast(int(x), 2, int(n))
-        if x == n - 1:
-            return True
+    if search == "interval":
+        return interval_search(length, lambda n: is_prime(n, bound, mode), diff, bound, rand=rand)
+    if search != "random":
+        raise ValueError("Unknown search '{}', expected 'interval' or 'random'.".format(search))
 
-    # return "composite"
-    return False
+    prime = rand(length)
+    while not is_prime(prime, bound, mode) or diff == prime:
+        prime = rand(length)
+    return prime
 
 
-def is_prime(n):
+def top_candidate(n):
     """
-    Utility function that determines whether a given number is prime or not.
+    Utility function that draws an odd candidate of n bits whose two top bits are set, so that the product of two
+    primes found from such candidates is exactly as long as their lengths added up.
 
-    :param n: an integer that is going to be tested for primality.
-    :return: True if the given number is find to be prime, False otherwise.
+    :param n: an integer of at least 2 representing the length (bitwise) of the candidate.
+    :return: a random odd integer of exactly n bits, at least 1.5 * 2^(n-1).
     """
 
-    # 1 is not considered a prime number
-    if n <= 1:
-        return False
+    return odd_candidate(n) | (1 << (n - 2))
 
-    # 2 and 3 are prime numbers
-    if n <= 3:
-        return True
 
-    # Every even number is composite
-    if n % 2 == 0:
-        return False
+def prime_task(length, bound=SIEVE_BOUND, mode="tuned", rand=odd_candidate):
+    """
+    A unit of work for the process pool: sieves a single interval of candidates.
 
-    # Run the Miller-Rabin test 40 times for each number
-    # Q: Why 40?
-    # A: https://stackoverflow.com/a/6330138
-    for _ in range(40):
-        if not miller_rabin(n):
-            return False
+    :param length: an integer representing the desired length of the prime.
+    :param bound: an integer representing the bound of the small primes used for trial division.
+    :param mode: a string representing the primality mode, see is_prime.
+    :param rand: a picklable function that returns a random odd candidate of the given length.
+    :return: a prime number of the desired length, or None if the interval held no prime.
+    """
 
-    # If it passes the test for all 40 iterations, then its a prime number, hopefully.
-    return True
+    return interval_search(length, lambda n: is_prime(n, bound, mode), 0, bound, rand=rand, intervals=1)
 
 
-def get_prime(length, diff=0):
+def get_primes_parallel(length, count=2, processes=None, bound=SIEVE_BOUND, mode="tuned", rand=odd_candidate):
     """
-    Utility function that produces a random prime of the desired length that is not equal to the parameter diff.
-
-    :param length: an integer representing the desired length of the prime that will be returned by the function.
-    :param diff: a prime number that should not be returned by the function.
-    :return: a random prime number
+    Utility function that searches for several distinct primes at once across a pool of processes.
+
+    Every worker sieves one interval per task, so that as soon as enough primes have been found the tasks
+    still waiting in the queue are cancelled and only the few running ones are waited for.
+
+    :param length: an integer representing the desired length of the primes.
+    :param count: an integer representing the number of distinct primes to be found.
+    :param processes: an integer representing the size of the pool, by default the number of cores.
+    :param bound: an integer representing the bound of the small primes used for trial division.
+    :param mode: a string representing the primality mode, see is_prime.
+    :param rand: a picklable function that returns a random odd candidate of the given length.
+    :return: a list of count distinct random primes.
     """
 
-    prime = n_bit_rand(length)
-    while not is_prime(prime) or diff == prime:
-        prime = n_bit_rand(length)
-    return prime
+    processes = processes or os.cpu_count() or 1
+    primes = []
+    # Reseed every worker from the OS, otherwise forked workers would share the parent's random state.
+    executor = ProcessPoolExecutor(processes, initializer=random.seed)
+    pending = set()
+    try:
+        pending = {executor.submit(prime_task, length, bound, mode, rand) for _ in range(2 * processes)}
+        while len(primes) < count:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                prime = future.result()
+                if prime is not None and prime not in primes and len(primes) < count:
+                    primes.append(prime)
+                if len(primes) < count:
+                    pending.add(executor.submit(prime_task, length, bound, mode, rand))
+    finally:
+        # Cancel the queued tasks by hand, shutdown(cancel_futures=True) needs Python 3.9.
+        for future in pending:
+            future.cancel()
+        executor.shutdown()
+    return primes
 
 
 def gcd(a, b):
@@ -114,54 +125,76 @@ def pick_coprime(x):
     :return: a co-prime of the given parameter.
     """
 
-    cp = random.randrange(1, x)
+    cp = randrange(1, x)
     while gcd(cp, x) != 1:
-        cp = random.randrange(1, x)
+        cp = randrange(1, x)
     return cp
 
 
-def fast(a, g, N):
+def check_policy(policy, bound):
     """
-    Implements a fast algorithm that calculates the modular exponentiation
-    of the parameters gives such as: Result = a^g mod N.
+    Utility function that validates a public exponent policy before any prime is drawn.
 
-    :param a: an integer representing the base factor of the calculation.
-    :param g: an integer representing the exponent factor of the calculation.
-    :param N: an integer representing the modulus factor of the calculation.
-    :return: an integer representing the modular exponentiation result equal to a^g mod N.
+    :param policy: a string representing the public exponent policy, see pick_exponent.
+    :param bound: an integer representing the fixed exponent or the lower bound of the smallest one.
     """
-    # g = (g_n g_n-1 ... g_0)_2
-    g = bin(g).replace("0b", "")[::-1]
-    # x <- a, d <- 1
-    x, d = a, 1
-    # for i=0 to n do
-    for i in range(len(g)):
-        # if g_1 = 1 then
-        if g[i] == '1':
-            # d <- d*x mod N
-            d = (d * x) % N
-        # x <- x^2 mod N
-        x = (x * x) % N
-    # return d
-    return d
+
+    if policy not in ("random", "fixed", "smallest"):
+        raise ValueError("Unknown policy '{}', expected 'random', 'fixed' or 'smallest'.".format(policy))
+    # φ(Ν) is even, so an even exponent is never valid and would make the key generation redraw primes forever.
+    if policy != "random" and (bound < 3 or bound % 2 == 0):
+        raise ValueError("The public exponent bound must be odd and at least 3, got {}.".format(bound))
 
 
-def generate(length):
+def pick_exponent(phi_N, policy="random", bound=65537):
+    """
+    Utility function that picks the public exponent according to a policy.
+
+    :param phi_N: an integer representing φ(Ν).
+    :param policy: "random" for a random co-prime of φ(Ν), "fixed" for e = bound, "smallest" for the smallest
+    valid odd e not below bound.
+    :param bound: an integer representing the fixed exponent or the lower bound of the smallest one.
+    :return: a valid public exponent, or None if the fixed exponent is not co-prime with φ(Ν).
+    """
+
+    check_policy(policy, bound)
+    if policy == "random":
+        return pick_coprime(phi_N)
+    if policy == "fixed":
+        return bound if gcd(bound, phi_N) == 1 else None
+    e = bound
+    while gcd(e, phi_N) != 1:
+        e += 2
+    return e
+
+
+def generate(length, processes=1, policy="random", bound=65537):
     """
     Utility function that generates the components needed for implementing of CRT-RSA.
 
     :param length: an integer representing the bit-length of the primes that are going to be produced.
+    :param processes: an integer representing the number of processes searching for p and q at the same time,
+    None for one per core.
+    :param policy: a string representing the public exponent policy, see pick_exponent.
+    :param bound: an integer representing the fixed public exponent or the lower bound of the smallest one.
     :return: a list that contains all the elements need to implement the CRT-RSA.
     """
 
-    # Produce two random primes, different from each other.
-    p = get_prime(length)
-    q = get_prime(length, p)
-    N = p * q
-    # Find the φ(Ν) value using Euler's formula
-    phi_N = (p - 1) * (q - 1)
-    # Find e and d such that e*d = 1 mod φ(Ν)
-    e = pick_coprime(phi_N)
+    check_policy(policy, bound)
+    e = None
+    while e is None:
+        # Produce two random primes, different from each other.
+        if processes == 1:
+            p = get_prime(length)
+            q = get_prime(length, p)
+        else:
+            p, q = get_primes_parallel(length, 2, processes)
+        N = p * q
+        # Find the φ(Ν) value using Euler's formula
+        phi_N = (p - 1) * (q - 1)
+        # Find e such that gcd(e, φ(Ν)) = 1, drawing new primes if a fixed e does not fit them
+        e = pick_exponent(phi_N, policy, bound)
+    # Find d such that e*d = 1 mod φ(Ν)
     d = pow(e, -1, phi_N)
     # d_p = e^-1 mod (p - 1)
     dp = pow(e, -1, p-1)
@@ -173,6 +206,81 @@ def generate(length):
     return p, q, e, d, N, dp, dq, iq
 
 
+def generate_key(length, processes=1, policy="random", bound=65537):
+    """
+    Utility function that generates a CRT-RSA key as a Key object, ready to be stored in a keystore.
+
+    :param length: an integer representing the bit-length of the primes that are going to be produced.
+    :param processes: an integer representing the number of processes searching for p and q at the same time,
+    None for one per core.
+    :param policy: a string representing the public exponent policy, see pick_exponent.
+    :param bound: an integer representing the fixed public exponent or the lower bound of the smallest one.
+    :return: a Key instance holding the components returned by generate.
+    """
+
+    return Key(*generate(length, processes, policy, bound))
+
+
+def generate_multi(length, count=3, processes=1, policy="random", bound=65537):
+    """
+    Utility function that generates the components needed for implementing multi-prime CRT-RSA.
+
+    The modulus is split among count primes of about length / count bits each, so at the same modulus size every
+    prime is shorter: it is found faster and every CRT exponentiation is cheaper. The leftover bits go to the first
+    primes, one each, and the primes are drawn again until the modulus is exactly length bits long.
+
+    :param length: an integer representing the bit-length of the modulus.
+    :param count: an integer representing the number of primes, at least 2.
+    :param processes: an integer representing the number of processes searching for the primes at the same time,
+    None for one per core.
+    :param policy: a string representing the public exponent policy, see pick_exponent.
+    :param bound: an integer representing the fixed public exponent or the lower bound of the smallest one.
+    :return: a list that contains the primes, e, d, N, the CRT exponents and the Garner coefficients.
+    """
+
+    if count < 2:
+        raise ValueError("Multi-prime RSA needs at least two primes.")
+
+    # lengths[i] is the bit-length of the i-th prime, they add up to length.
+    lengths = [length // count + (i < length % count) for i in range(count)]
+    check_policy(policy, bound)
+    e = None
+    while e is None:
+        # Produce count random primes, different from each other, with their two top bits set.
+        if processes == 1:
+            primes = []
+            while len(primes) < count:
+                prime = get_prime(lengths[len(primes)], rand=top_candidate)
+                if prime not in primes:
+                    primes.append(prime)
+        else:
+            primes = []
+            for size in sorted(set(lengths), reverse=True):
+                primes += get_primes_parallel(size, lengths.count(size), processes, rand=top_candidate)
+        N = 1
+        phi_N = 1
+        for r in primes:
+            N *= r
+            phi_N *= r - 1
+        # With more than two primes the top bits alone do not guarantee the length of the modulus.
+        if N.bit_length() != length:
+            continue
+        # Find e such that gcd(e, φ(Ν)) = 1, drawing new primes if a fixed e does not fit them
+        e = pick_exponent(phi_N, policy, bound)
+    # Find d such that e*d = 1 mod φ(Ν)
+    d = pow(e, -1, phi_N)
+    # d_i = e^-1 mod (r_i - 1)
+    exponents = [pow(e, -1, r - 1) for r in primes]
+    # t_i = (r_1 * ... * r_{i-1})^-1 mod r_i, for i = 2, ..., count
+    coefficients = []
+    R = primes[0]
+    for r in primes[1:]:
+        coefficients.append(pow(R, -1, r))
+        R *= r
+
+    return primes, e, d, N, exponents, coefficients
+
+
 def encrypt(m, e, N):
     """
     Function implementing the encryption stage of the CRT-RSA.
@@ -183,8 +291,13 @@ def encrypt(m, e, N):
     :return: a list that contains the encryption of the message, letter by letter.
     """
 
-    # Use letter^e mod N for each letter in the message m.
-    return [fast(ord(char), e, N) for char in m]
+    # The exponent and modulus are the same for every letter, so they are prepared once.
+    context = FixedExponent(e, N)
+    # Use letter^e mod N for each letter in the message m, encrypting every distinct letter only once.
+    cache = {}
+    for char in set(m):
+        cache[char] = context.exp(ord(char))
+    return [cache[char] for char in m]
 
 
 def decrypt(c, p, q, dp, dq, iq):
@@ -200,27 +313,502 @@ def decrypt(c, p, q, dp, dq, iq):
     :return: a string representing the original message produced by the decryption process.
     """
 
-    m = []
     # For each number in the cipher list
-    for num in c:
-        # S_p = c^{d_p} mod p
-        mp = pow(num, dp, p)
-        # S_q = c^{d_q} mod q
-        mq = pow(num, dq, q)
-        # h = (i_q * (S_p - S_q)) mod p
-        h = (iq * (mp - mq)) % p
-        # S = S_q + q * h
-        m.append(mq + q * h)
-    return ''.join(chr(i) for i in m)
+    return ''.join(chr(crt(num, p, q, dp, dq, iq)) for num in c)
+
+
+def crt(num, p, q, dp, dq, iq):
+    """
+    Utility function that decrypts a single integer using the CRT.
+
+    :param num: an integer representing a ciphertext.
+    :param p: the first prime used for key generation.
+    :param q: the second prime used for key generation.
+    :param dp: an integer representing the modulo of the private key with respect to p.
+    :param dq: an integer representing the modulo of the private key with respect to q.
+    :param iq: the modular multiplicative inverse of q.
+    :return: an integer representing num^d mod N.
+    """
+
+    # S_p = c^{d_p} mod p
+    mp = pow(num, dp, p)
+    # S_q = c^{d_q} mod q
+    mq = pow(num, dq, q)
+    # h = (i_q * (S_p - S_q)) mod p
+    h = (iq * (mp - mq)) % p
+    # S = S_q + q * h
+    return mq + q * h
+
+
+def crt_multi(num, primes, exponents, coefficients):
+    """
+    Utility function that decrypts a single integer under a multi-prime key, using Garner's recombination.
+
+    :param num: an integer representing a ciphertext.
+    :param primes: a list of the primes used for key generation.
+    :param exponents: a list of the private key modulo every prime minus one.
+    :param coefficients: a list of the Garner coefficients, as returned by generate_multi.
+    :return: an integer representing num^d mod N.
+    """
+
+    # m = m_1, R = r_1
+    m = pow(num, exponents[0], primes[0])
+    R = primes[0]
+    for r, d, t in zip(primes[1:], exponents[1:], coefficients):
+        # m_i = c^{d_i} mod r_i
+        mi = pow(num, d, r)
+        # h = (t_i * (m_i - m)) mod r_i
+        h = (t * (mi - m)) % r
+        # m = m + R * h, R = R * r_i
+        m += R * h
+        R *= r
+    return m
+
+
+def decrypt_multi(c, primes, exponents, coefficients):
+    """
+    Function implementing the decryption stage of multi-prime CRT-RSA.
+
+    :param c: a list representing the ciphertext produced by encrypting.
+    :param primes: a list of the primes used for key generation.
+    :param exponents: a list of the private key modulo every prime minus one.
+    :param coefficients: a list of the Garner coefficients, as returned by generate_multi.
+    :return: a string representing the original message produced by the decryption process.
+    """
+
+    return ''.join(chr(crt_multi(num, primes, exponents, coefficients)) for num in c)
+
+
+def batch_helps(exponents, N):
+    """
+    Utility function that estimates whether batching a group of ciphertexts is cheaper than decrypting them one by one.
+
+    A batch replaces len(exponents) - 1 full exponentiations by exponentiations to products of the public exponents
+    along a tree of depth log(len(exponents)), so it only pays off while those products stay short next to N.
+
+    :param exponents: a list of pairwise co-prime public exponents.
+    :param N: an integer representing the modulus.
+    :return: True if the batch is expected to be cheaper, False otherwise.
+    """
+
+    if len(exponents) < 2:
+        return False
+    depth = (len(exponents) - 1).bit_length()
+    return depth * sum(e.bit_length() for e in exponents) < N.bit_length() // 2
+
+
+def fiat_decrypt(c, exponents, p, q, iq):
+    """
+    Implements Fiat's batch RSA: decrypts one ciphertext per public exponent with a single full exponentiation.
+
+    The ciphertexts are combined up a product tree into v = prod(c_i^(e / e_i)) with e = prod(e_i), v^(1/e) is
+    computed once with the CRT, and the individual roots are split back out down the tree.
+
+    :param c: a list of ciphertexts, the i-th one encrypted under exponents[i].
+    :param exponents: a list of pairwise co-prime public exponents sharing the modulus p * q.
+    :param p: the first prime used for key generation.
+    :param q: the second prime used for key generation.
+    :param iq: the modular multiplicative inverse of q.
+    :return: a list of the decrypted integers, in the same order as c.
+    """
+
+    N = p * q
+
+    # Each node is (e, v, left, right) with v = v_left^e_right * v_right^e_left.
+    def up(lo, hi):
+        if hi - lo == 1:
+            return exponents[lo], c[lo] % N, None, None
+        mid = (lo + hi) // 2
+        left, right = up(lo, mid), up(mid, hi)
+        e = left[0] * right[0]
+        v = pow(left[1], right[0], N) * pow(right[1], left[0], N) % N
+        return e, v, left, right
+
+    # Given m = v^(1/e) for a node, recover the roots of its children.
+    def down(node, m, out):
+        e, v, left, right = node
+        if left is None:
+            out.append(m)
+            return
+        eL, vL = left[0], left[1]
+        eR, vR = right[0], right[1]
+        # X = 0 mod e_L, X = 1 mod e_R
+        X = eL * pow(eL, -1, eR)
+        # m_R = m^X / (v_L^(X / e_L) * v_R^((X - 1) / e_R)), m_L = m / m_R
+        mR = pow(m, X, N) * pow(pow(vL, X // eL, N) * pow(vR, (X - 1) // eR, N), -1, N) % N
+        mL = m * pow(mR, -1, N) % N
+        down(left, mL, out)
+        down(right, mR, out)
+
+    root = up(0, len(c))
+    e = root[0]
+    out = []
+    down(root, crt(root[1], p, q, pow(e, -1, p - 1), pow(e, -1, q - 1), iq), out)
+    return out
+
+
+def batch_decrypt(c, exponents, p, q, iq, batch_size=8):
+    """
+    Function implementing batch decryption of many ciphertexts under one modulus.
+
+    The ciphertexts may share a single public exponent or use a family of small public exponents over the same
+    modulus. Ciphertexts under pairwise co-prime exponents are grouped into batches for fiat_decrypt, and every
+    group that would not benefit from batching falls back to the per item CRT path. The CRT exponents of every
+    distinct public exponent are computed only once for the whole call.
+
+    :param c: a list of ciphertexts.
+    :param exponents: the public exponent shared by every ciphertext, or a list with one exponent per ciphertext.
+    :param p: the first prime used for key generation.
+    :param q: the second prime used for key generation.
+    :param iq: the modular multiplicative inverse of q.
+    :param batch_size: an integer bounding the number of ciphertexts combined in a single batch.
+    :return: a list of the decrypted integers, in the same order as c.
+    """
+
+    if isinstance(exponents, int):
+        exponents = len(c) * [exponents]
+    N = p * q
+
+    # Greedily place every ciphertext in the first batch whose exponents are all co-prime with its own.
+    batches = []
+    alone = []
+    for i, e in enumerate(exponents):
+        # A ciphertext sharing a factor with N, such as 0, is not invertible and cannot take part in a batch.
+        if gcd(c[i], N) != 1:
+            alone.append(i)
+            continue
+        for batch in batches:
+            if len(batch[1]) < batch_size and gcd(batch[0], e) == 1:
+                batch[0] *= e
+                batch[1].append(i)
+                break
+        else:
+            batches.append([e, [i]])
+    # Single ciphertexts always take the per item path.
+    batches += [[exponents[i], [i]] for i in alone]
+
+    m = len(c) * [None]
+    shared = {}
+    for _, indices in batches:
+        batch_exponents = [exponents[i] for i in indices]
+        if batch_helps(batch_exponents, N):
+            for i, num in zip(indices, fiat_decrypt([c[i] for i in indices], batch_exponents, p, q, iq)):
+                m[i] = num
+            continue
+        for i in indices:
+            e = exponents[i]
+            if e not in shared:
+                shared[e] = pow(e, -1, p - 1), pow(e, -1, q - 1)
+            m[i] = crt(c[i], p, q, *shared[e], iq)
+    return m
+
+
+def read_ciphertexts(source, chunk_size=256, block_size=1 << 16):
+    """
+    Utility function that reads serialized ciphertext integers in chunks.
+
+    The integers may be separated by whitespace, newlines or commas, so both one integer per line and the list
+    printed by the letter by letter mode are understood. The input is read in fixed-size blocks, never a line at
+    a time, so that a single-line list does not have to fit in memory.
+
+    :param source: a text file object, such as sys.stdin.
+    :param chunk_size: an integer representing the number of ciphertexts per chunk.
+    :param block_size: an integer representing the number of characters read at once.
+    :return: a generator of lists of at most chunk_size integers.
+    """
+
+    separators = str.maketrans(",[]", "   ")
+    chunk = []
+    # The last token of a block may continue in the next one.
+    partial = ""
+    for block in iter(lambda: source.read(block_size), ""):
+        block = partial + block.translate(separators)
+        tokens = block.split()
+        partial = tokens.pop() if tokens and not block[-1].isspace() else ""
+        for token in tokens:
+            chunk.append(int(token))
+            if len(chunk) == chunk_size:
+                yield chunk
+                chunk = []
+    if partial:
+        chunk.append(int(partial))
+    if chunk:
+        yield chunk
+
+
+def decrypt_file(source, destination, p, q, dp, dq, iq, processes=None, chunk_size=256, max_pending=None):
+    """
+    Function implementing streaming decryption of a ciphertext file over a pool of processes.
+
+    Chunks of ciphertexts are handed to the pool as they are read and at most max_pending chunks are in flight at
+    any time, so the memory used does not depend on the size of the input. The plaintext is written in the order
+    of the ciphertexts.
+
+    :param source: a text file object holding the serialized ciphertext integers, such as sys.stdin.
+    :param destination: a text file object to which the plaintext is written, such as sys.stdout.
+    :param p: the first prime used for key generation.
+    :param q: the second prime used for key generation.
+    :param dp: an integer representing the modulo of the private key with respect to p.
+    :param dq: an integer representing the modulo of the private key with respect to q.
+    :param iq: the modular multiplicative inverse of q.
+    :param processes: an integer representing the size of the pool, by default the number of cores.
+    :param chunk_size: an integer representing the number of ciphertexts per task.
+    :param max_pending: an integer bounding the number of chunks in flight, by default twice the pool size.
+    :return: an integer representing the number of ciphertexts decrypted.
+    """
+
+    processes = processes or os.cpu_count() or 1
+    max_pending = max_pending or 2 * processes
+    pending = collections.deque()
+    count = 0
+    with ProcessPoolExecutor(processes) as executor:
+        for chunk in read_ciphertexts(source, chunk_size):
+            # Wait for the oldest chunk before reading further once the queue is full.
+            if len(pending) == max_pending:
+                destination.write(pending.popleft().result())
+            pending.append(executor.submit(decrypt, chunk, p, q, dp, dq, iq))
+            count += len(chunk)
+        while pending:
+            destination.write(pending.popleft().result())
+    return count
+
+
+def encrypt_stream(source, e, N):
+    """
+    Function implementing the block mode of the CRT-RSA encryption stage.
+
+    The message is split into blocks as large as the modulus allows, every block is padded with OAEP and
+    encrypted as a single integer, so the whole message costs one exponentiation per block instead of one
+    per character.
+
+    :param source: a str, a bytes-like object, a binary file object or an iterable of bytes chunks.
+    :param e: an integer representing the public key.
+    :param N: an integer representing the modulus.
+    :return: a generator of ciphertext blocks, each as long as the modulus in bytes.
+    """
+
+    k = (N.bit_length() + 7) // 8
+    if capacity(k) < 1:
+        raise ValueError("Modulus too small for OAEP with SHA-256")
+    context = FixedExponent(e, N)
+    for block in read_blocks(source, capacity(k)):
+        num = int.from_bytes(oaep_encode(block, k), "big")
+        yield context.exp(num).to_bytes(k, "big")
+
+
+def encrypt_blocks(m, e, N):
+    """
+    Function implementing the block mode of the CRT-RSA encryption stage for a message held in memory.
+
+    :param m: a str or bytes-like object representing the original message before encryption.
+    :param e: an integer representing the public key.
+    :param N: an integer representing the modulus.
+    :return: a bytes object that contains the encrypted blocks back to back.
+    """
+
+    return b"".join(encrypt_stream(m, e, N))
+
+
+def decrypt_stream(source, p, q, dp, dq, iq):
+    """
+    Function implementing the block mode of the CRT-RSA decryption stage.
+
+    :param source: a bytes-like object, a binary file object or an iterable of bytes chunks holding the
+    ciphertext blocks back to back.
+    :param p: the first prime used for key generation.
+    :param q: the second prime used for key generation.
+    :param dp: an integer representing the modulo of the private key with respect to p.
+    :param dq: an integer representing the modulo of the private key with respect to q.
+    :param iq: the modular multiplicative inverse of q.
+    :return: a generator of the original message blocks.
+    """
+
+    k = ((p * q).bit_length() + 7) // 8
+    for block in read_blocks(source, k):
+        if len(block) != k:
+            raise ValueError("Ciphertext is not a whole number of {}-byte blocks.".format(k))
+        num = crt(int.from_bytes(block, "big"), p, q, dp, dq, iq)
+        yield oaep_decode(num.to_bytes(k, "big"), k)
+
+
+def decrypt_blocks(c, p, q, dp, dq, iq):
+    """
+    Function implementing the block mode of the CRT-RSA decryption stage for a ciphertext held in memory.
+
+    :param c: a bytes-like object as produced by encrypt_blocks.
+    :param p: the first prime used for key generation.
+    :param q: the second prime used for key generation.
+    :param dp: an integer representing the modulo of the private key with respect to p.
+    :param dq: an integer representing the modulo of the private key with respect to q.
+    :param iq: the modular multiplicative inverse of q.
+    :return: a bytes object representing the original message.
+    """
+
+    return b"".join(decrypt_stream(c, p, q, dp, dq, iq))
+
+
+def benchmark_generate(length=1024, trials=3, max_processes=None):
+    """
+    Measures the key generation time for every pool size from a single process up to the number of cores.
+
+    :param length: an integer representing the bit-length of the primes.
+    :param trials: an integer representing the number of keys generated per pool size.
+    :param max_processes: an integer representing the largest pool size, by default the number of cores.
+    :return: a dictionary that maps every pool size to its average time per key, in seconds.
+    """
+
+    results = {}
+    for processes in range(1, (max_processes or os.cpu_count() or 1) + 1):
+        start = time.perf_counter()
+        for _ in range(trials):
+            generate(length, processes)
+        results[processes] = (time.perf_counter() - start) / trials
+        print("{:>3} processes: {:8.3f} s per key, speedup {:.2f}x".format(
+            processes, results[processes], results[1] / results[processes]))
+    return results
+
+
+def benchmark_blocks(length=1024, size=2048):
+    """
+    Compares the letter by letter and the block modes on a random message.
+
+    :param length: an integer representing the bit-length of the primes.
+    :param size: an integer representing the length of the message, in characters.
+    :return: a dictionary that maps every mode to its throughput, in characters per second.
+    """
+
+    p, q, e, d, N, dp, dq, iq = generate(length)
+    message = ''.join(chr(random.randint(32, 126)) for _ in range(size))
+    modes = {
+        "letter by letter": lambda: decrypt(encrypt(message, e, N), p, q, dp, dq, iq),
+        "block": lambda: decrypt_blocks(encrypt_blocks(message, e, N), p, q, dp, dq, iq),
+    }
+
+    results = {}
+    for name, mode in modes.items():
+        start = time.perf_counter()
+        mode()
+        results[name] = size / (time.perf_counter() - start)
+        print("{:>16}: {:12.1f} characters per second".format(name, results[name]))
+    return results
+
+
+def benchmark_multi(lengths=(2048, 4096), counts=(2, 3, 4), trials=20):
+    """
+    Compares the decryption time of multi-prime keys with a different number of primes at the same modulus size.
+
+    :param lengths: a list of the bit-lengths of the moduli to be compared.
+    :param counts: a list of the number of primes to be compared.
+    :param trials: an integer representing the number of ciphertexts decrypted per key.
+    :return: a dictionary that maps every (length, count) pair to its average time per decryption, in seconds.
+    """
+
+    results = {}
+    for length in lengths:
+        for count in counts:
+            primes, e, d, N, exponents, coefficients = generate_multi(length, count, processes=None)
+            c = [random.randrange(N) for _ in range(trials)]
+            start = time.perf_counter()
+            for num in c:
+                crt_multi(num, primes, exponents, coefficients)
+            results[length, count] = (time.perf_counter() - start) / trials
+            print("{:>5} bits, {} primes: {:8.3f} ms per decryption".format(
+                length, count, 1000 * results[length, count]))
+    return results
+
+
+def benchmark_batch(length=1024, size=64, exponents=(3, 5, 7, 11, 13, 17, 19, 23)):
+    """
+    Compares batch decryption with per item decryption for ciphertexts under a family of small public exponents.
+
+    :param length: an integer representing the bit-length of the primes.
+    :param size: an integer representing the number of ciphertexts.
+    :param exponents: a list of pairwise co-prime small public exponents.
+    :return: a dictionary that maps every mode to its throughput, in decryptions per second.
+    """
+
+    # Find primes for which every exponent of the family is valid.
+    while True:
+        p, q, e, d, N, dp, dq, iq = generate(length)
+        if all(gcd(x, (p - 1) * (q - 1)) == 1 for x in exponents):
+            break
+    family = [exponents[i % len(exponents)] for i in range(size)]
+    c = [pow(random.randrange(N), x, N) for x in family]
+
+    modes = {
+        "per item": lambda: batch_decrypt(c, family, p, q, iq, batch_size=1),
+        "batch": lambda: batch_decrypt(c, family, p, q, iq),
+    }
+    results = {}
+    for name, mode in modes.items():
+        start = time.perf_counter()
+        mode()
+        results[name] = size / (time.perf_counter() - start)
+        print("{:>10}: {:10.1f} decryptions per second".format(name, results[name]))
+    return results
+
+
+def benchmark_stream(length=1024, size=2048, max_processes=None):
+    """
+    Measures the throughput of decrypt_file for every pool size from a single process up to the number of cores.
+
+    :param length: an integer representing the bit-length of the primes.
+    :param size: an integer representing the number of ciphertexts.
+    :param max_processes: an integer representing the largest pool size, by default the number of cores.
+    :return: a dictionary that maps every pool size to its throughput, in ciphertexts per second.
+    """
+
+    p, q, e, d, N, dp, dq, iq = generate(length)
+    message = ''.join(chr(random.randint(32, 126)) for _ in range(size))
+    serialized = "\n".join(str(num) for num in encrypt(message, e, N))
+
+    results = {}
+    for processes in range(1, (max_processes or os.cpu_count() or 1) + 1):
+        output = io.StringIO()
+        start = time.perf_counter()
+        decrypt_file(io.StringIO(serialized), output, p, q, dp, dq, iq, processes)
+        results[processes] = size / (time.perf_counter() - start)
+        print("{:>3} processes: {:10.1f} ciphertexts per second, {:10.1f} per core".format(
+            processes, results[processes], results[processes] / processes))
+    return results
+
+
+def benchmark_exponents(length=1024, trials=50):
+    """
+    Compares the cost of the public key operation under every public exponent policy.
+
+    :param length: an integer representing the bit-length of the primes.
+    :param trials: an integer representing the number of encryptions per policy.
+    :return: a dictionary that maps every policy to its average time per encryption, in seconds.
+    """
+
+    results = {}
+    for policy in ("random", "smallest", "fixed"):
+        p, q, e, d, N, dp, dq, iq = generate(length, policy=policy)
+        context = FixedExponent(e, N)
+        m = [random.randrange(N) for _ in range(trials)]
+        start = time.perf_counter()
+        for num in m:
+            context.exp(num)
+        results[policy] = (time.perf_counter() - start) / trials
+        print("{:>8} (e has {:>4} bits): {:10.4f} ms per encryption".format(
+            policy, e.bit_length(), 1000 * results[policy]))
+    return results
 
 
 if __name__ == '__main__':
     message = "Hope that encrypting the message letter by letter is the right way of doing it."
     # Produce the needed parameters for RSA using length-bit primes.
-    p, q, e, d, N, dp, dq, iq = generate(length=2048)
+    p, q, e, d, N, dp, dq, iq = generate(length=2048, processes=None)
     # Encrypt the text into a list of big integers.
     c = encrypt(message, e, N)
     print("Text encrypted into the following list: {}".format(c))
     # Decrypt the array of integers using the CRT.
     m = decrypt(c, p, q, dp, dq, iq)
     print("Original message after decrypting: {}".format(m))
+
+    # Encrypt the whole text as padded blocks instead.
+    c = encrypt_blocks(message, e, N)
+    print("Text encrypted into {} bytes of padded blocks.".format(len(c)))
+    m = decrypt_blocks(c, p, q, dp, dq, iq).decode()
+    print("Original message after decrypting the blocks: {}".format(m))
@@ -0,0 +1,222 @@
+import os
+import random
+import threading
+import time
+import weakref
+
+# Number of random bytes drawn from the operating system at once.
+BUFFER_SIZE = 1 << 16
+# Every pool, so that the buffers can be dropped in a forked child.
+POOLS = weakref.WeakSet()
+
+
+class RandomPool:
+    """
+    A buffered source of cryptographically secure randomness.
+
+    The operating system generator is called once per BUFFER_SIZE bytes and every draw is served from the buffer,
+    so that a draw costs a slice instead of a system call. A pool can be shared between threads, and a forked
+    process never reuses the buffer of its parent, it starts over with a fresh one.
+    """
+
+    def __init__(self, size=BUFFER_SIZE):
+        """
+        :param size: an integer representing the number of bytes drawn from the operating system at once.
+        """
+
+        self.size = size
+        self.buffer = b""
+        self.position = 0
+        # Guards the buffer and the position, so that no two threads are handed the same bytes.
+        self.lock = threading.Lock()
+        POOLS.add(self)
+
+    def reset(self):
+        """
+        Drops the buffered bytes.
+        """
+
+        self.buffer, self.position = b"", 0
+        # Another thread of the parent may have held the lock while forking, a child starts with a free one.
+        self.lock = threading.Lock()
+
+    def bytes(self, n):
+        """
+        :param n: an integer representing the number of bytes.
+        :return: a bytes object of n random bytes.
+        """
+
+        if n > self.size:
+            return os.urandom(n)
+        with self.lock:
+            end = self.position + n
+            if end > len(self.buffer):
+                self.buffer, self.position, end = os.urandom(self.size), 0, n
+            data = self.buffer[self.position:end]
+            self.position = end
+            return data
+
+    def randbits(self, k):
+        """
+        :param k: a non negative integer representing a number of bits.
+        :return: a random integer in [0, 2^k).
+        """
+
+        return int.from_bytes(self.bytes((k + 7) // 8), "big") >> (-k % 8)
+
+    def randbelow(self, n):
+        """
+        :param n: a positive integer.
+        :return: a uniformly random integer in [0, n).
+        """
+
+        k = n.bit_length()
+        r = self.randbits(k)
+        while r >= n:
+            r = self.randbits(k)
+        return r
+
+    def randrange(self, start, stop):
+        """
+        :param start: an integer representing the (inclusive) lower end of the range.
+        :param stop: an integer representing the (exclusive) upper end of the range.
+        :return: a uniformly random integer in [start, stop).
+        """
+
+        if stop <= start:
+            raise ValueError("Empty range [{}, {}).".format(start, stop))
+        return start + self.randbelow(stop - start)
+
+    def n_bit(self, n):
+        """
+        :param n: a positive integer representing the length (bitwise) of the integer to be produced.
+        :return: a random integer of exactly n bits.
+        """
+
+        k = n - 1
+        return int.from_bytes(self.bytes((k + 7) // 8), "big") >> (-k % 8) | (1 << k)
+
+    def odd_candidate(self, n):
+        """
+        :param n: an integer of at least 2 representing the length (bitwise) of the candidate.
+        :return: a random odd integer of exactly n bits, a candidate for a prime search.
+        """
+
+        k = n - 1
+        return int.from_bytes(self.bytes((k + 7) // 8), "big") >> (-k % 8) | (1 << k) | 1
+
+    def symbols(self, alphabet, count):
+        """
+        Draws uniformly random symbols. Bytes are mapped to symbols through a translation table, and the bytes
+        that would bias the result are rejected by the same table.
+
+        :param alphabet: a string of at most 256 distinct ASCII symbols.
+        :param count: an integer representing the number of symbols.
+        :return: a string of count random symbols of the alphabet.
+        """
+
+        table = alphabet.encode("ascii")
+        if not 0 < len(table) <= 256:
+            raise ValueError("The alphabet must hold between 1 and 256 symbols.")
+        limit = 256 - 256 % len(table)
+        translation = bytes(table[b % len(table)] for b in range(256))
+        rejected = bytes(range(limit, 256))
+        result = bytearray()
+        while len(result) < count:
+            # Draw a little more than needed to make up for the rejected bytes.
+            missing = count - len(result)
+            result += self.bytes(missing + missing * (256 - limit) // limit + 1).translate(translation, rejected)
+        return result[:count].decode("ascii")
+
+
+def reset_pools():
+    """
+    Drops the buffers of every pool in a forked child, where the parent may still serve the same bytes.
+    """
+
+    for pool in POOLS:
+        pool.reset()
+
+
+# Only Unix can fork, there is nothing to guard against elsewhere.
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=reset_pools)
+# Shared by the module functions below.
+POOL = RandomPool()
+
+
+def randrange(start, stop):
+    """
+    :return: a uniformly random integer in [start, stop), see RandomPool.randrange.
+    """
+
+    return POOL.randrange(start, stop)
+
+
+def n_bit_rand(n):
+    """
+    Utility function used to generate a random n-bit integer.
+
+    :param n: an integer representing the length (bitwise) of the integer to be produced.
+    :return: an integer of the desired length (bitwise).
+    """
+
+    return POOL.n_bit(n)
+
+
+def odd_candidate(n):
+    """
+    :return: a random odd integer of exactly n bits, see RandomPool.odd_candidate.
+    """
+
+    return POOL.odd_candidate(n)
+
+
+def symbols(alphabet, count):
+    """
+    :return: a string of count random symbols of the alphabet, see RandomPool.symbols.
+    """
+
+    return POOL.symbols(alphabet, count)
+
+
+def benchmark(bits=1024, draws=100000):
+    """
+    Measures the draws per second of the pool against the random module and a system call per draw.
+
+    :param bits: an integer representing the length of the integers drawn.
+    :param draws: an integer representing the number of draws.
+    :return: a dictionary holding the draws per second of every method.
+    """
+
+    methods = {
+        "random.randrange": lambda: random.randrange(2 ** (bits - 1) + 1, 2 ** bits - 1),
+        "os.urandom per draw": lambda: int.from_bytes(os.urandom(bits // 8), "big") | (1 << (bits - 1)),
+        "n_bit_rand": lambda: n_bit_rand(bits),
+        "odd_candidate": lambda: odd_candidate(bits),
+    }
+    results = {}
+    for name, draw in methods.items():
+        start = time.perf_counter()
+        for _ in range(draws):
+            draw()
+        results[name] = draws / (time.perf_counter() - start)
+        print("{:>20}: {:12.0f} {}-bit draws/s".format(name, results[name], bits))
+
+    alphabet = "ABCDEFGHIJKLMNOPQRSTUVWXYZ.!?()-"
+    start = time.perf_counter()
+    "".join(alphabet[random.randint(0, len(alphabet) - 1)] for _ in range(draws))
+    results["random.randint symbols"] = draws / (time.perf_counter() - start)
+    start = time.perf_counter()
+    symbols(alphabet, draws)
+    results["symbols"] = draws / (time.perf_counter() - start)
+    print("{:>20}: {:12.0f} symbols/s".format("random.randint", results["random.randint symbols"]))
+    print("{:>20}: {:12.0f} symbols/s".format("symbols", results["symbols"]))
+    return results
+
+
+if __name__ == '__main__':
+    print("A 16-bit integer: {}".format(n_bit_rand(16)))
+    print("A 64-bit odd candidate: {}".format(odd_candidate(64)))
+    print("Random symbols: {}".format(symbols("ABCDEFGHIJKLMNOPQRSTUVWXYZ", 32)))
+    benchmark()
@@ -0,0 +1,189 @@
+import collections
+import random
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+
+class KeyPool:
+    """
+    A pool of pre-generated keypairs that hides the unpredictable latency of key generation.
+
+    Background worker processes keep the pool topped up: once its depth drops below the low-water mark, new keys
+    are generated until it reaches the high-water mark again. Taking a key is a queue pop, and a caller only has
+    to wait when the pool has run dry. After max_failures generations in a row have failed the pool stops
+    refilling, and a caller that finds it empty gets the last error instead of waiting forever.
+    """
+
+    def __init__(self, factory, low=4, high=16, processes=None, max_failures=3):
+        """
+        :param factory: a picklable function without arguments that returns a new keypair, such as
+        functools.partial(generate_key, 2048).
+        :param low: an integer representing the depth below which the pool starts refilling.
+        :param high: an integer representing the depth at which the pool stops refilling.
+        :param processes: an integer representing the number of worker processes, by default the number of cores.
+        :param max_failures: an integer representing the number of failed generations in a row after which the
+        pool stops refilling.
+        """
+
+        if not 0 <= low < high:
+            raise ValueError("The water marks must satisfy 0 <= low < high.")
+        self.factory = factory
+        self.low, self.high = low, high
+        self.keys = collections.deque()
+        self.condition = threading.Condition()
+        # Reseed every worker from the OS, otherwise forked workers would share the parent's random state.
+        self.executor = ProcessPoolExecutor(processes, initializer=random.seed)
+        self.closed = False
+        self.refilling = True
+        self.in_flight = 0
+        self.futures = set()
+        self.max_failures = max_failures
+        self.failures = 0
+        self.last_error = None
+        # Metrics
+        self.started = time.perf_counter()
+        self.generated = self.errors = self.gets = self.waits = 0
+        self.wait_time = 0.0
+        with self.condition:
+            self.refill()
+
+    def refill(self):
+        """
+        Submits new generation tasks when needed. Must be called while holding the condition.
+        """
+
+        if self.closed or self.failures >= self.max_failures:
+            return
+        if len(self.keys) < self.low:
+            self.refilling = True
+        while self.refilling and len(self.keys) + self.in_flight < self.high:
+            self.in_flight += 1
+            future = self.executor.submit(self.factory)
+            self.futures.add(future)
+            future.add_done_callback(self.done)
+        if len(self.keys) + self.in_flight >= self.high:
+            self.refilling = False
+
+    def done(self, future):
+        """
+        Collects a generated key. Called by the executor once a task has finished.
+
+        :param future: the finished task.
+        """
+
+        with self.condition:
+            self.in_flight -= 1
+            self.futures.discard(future)
+            if future.cancelled():
+                pass
+            elif future.exception() is not None:
+                self.errors += 1
+                self.failures += 1
+                self.last_error = future.exception()
+                # Wake the waiting callers, the pool may have just stalled.
+                self.condition.notify_all()
+            else:
+                self.keys.append(future.result())
+                self.generated += 1
+                self.failures = 0
+                self.condition.notify()
+            self.refill()
+
+    def stalled(self):
+        """
+        :return: True if the pool stopped refilling after repeated failures and no generation is left in flight.
+        Must be called while holding the condition.
+        """
+
+        return self.failures >= self.max_failures and self.in_flight == 0
+
+    def get(self, timeout=None):
+        """
+        Takes a keypair out of the pool, waiting for one to be generated if the pool is empty.
+
+        :param timeout: a float bounding the wait in seconds, unbounded by default.
+        :return: a keypair, as returned by the factory.
+        :raises: the last error of the factory if the pool has stalled, in which case the next call tries again.
+        """
+
+        with self.condition:
+            if self.closed:
+                raise RuntimeError("The key pool is closed.")
+            self.gets += 1
+            if not self.keys:
+                self.waits += 1
+                start = time.perf_counter()
+                self.condition.wait_for(lambda: self.keys or self.closed or self.stalled(), timeout)
+                self.wait_time += time.perf_counter() - start
+                if self.closed:
+                    raise RuntimeError("The key pool is closed.")
+                if not self.keys and self.stalled():
+                    # Report the failure, and let the next call retry from scratch.
+                    error = self.last_error
+                    self.failures = 0
+                    self.refill()
+                    raise error
+                if not self.keys:
+                    raise TimeoutError("No keypair became available in time.")
+            key = self.keys.popleft()
+            self.refill()
+            return key
+
+    def metrics(self):
+        """
+        :return: a dictionary with the current depth, the tasks in flight, the refill rate in keys per second,
+        and how many callers had to wait and for how long in total.
+        """
+
+        with self.condition:
+            elapsed = time.perf_counter() - self.started
+            return {
+                "depth": len(self.keys),
+                "in_flight": self.in_flight,
+                "generated": self.generated,
+                "errors": self.errors,
+                "stalled": self.stalled(),
+                "refill_rate": self.generated / elapsed if elapsed else 0.0,
+                "gets": self.gets,
+                "waits": self.waits,
+                "wait_time": self.wait_time,
+            }
+
+    def close(self):
+        """
+        Stops the worker processes, discarding the keys still being generated.
+        """
+
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+            futures = list(self.futures)
+        # Cancel the queued tasks by hand, shutdown(cancel_futures=True) needs Python 3.9.
+        for future in futures:
+            future.cancel()
+        self.executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+if __name__ == '__main__':
+    import functools
+    import importlib
+
+    # crt-rsa is not a valid module name, so it is imported by its file name.
+    crt_rsa = importlib.import_module("crt-rsa")
+
+    with KeyPool(functools.partial(crt_rsa.generate_key, 512), low=2, high=6) as pool:
+        # Let the workers fill the pool up to its high-water mark first.
+        while pool.metrics()["depth"] < pool.high:
+            time.sleep(0.1)
+        for _ in range(10):
+            start = time.perf_counter()
+            key = pool.get()
+            print("Got a key in {:8.3f} ms: {}".format(1000 * (time.perf_counter() - start), key))
+        print(pool.metrics())
@@ -0,0 +1,226 @@
+import mmap
+import struct
+
+from mod_exp import FixedExponent
+
+# File signature and version of the keystore format.
+MAGIC = b"RSAK"
+VERSION = 1
+# magic, version, number of fields per key, width of every field in bytes
+HEADER = struct.Struct(">4sHHI")
+# The CRT-RSA components stored for every key, in the order returned by generate.
+FIELDS = ("p", "q", "e", "d", "N", "dp", "dq", "iq")
+
+
+class Key:
+    """
+    A CRT-RSA key that keeps its exponentiation contexts next to its components.
+
+    The contexts are built on first use and then reused by every operation, so that a key loaded from a keystore
+    costs nothing until it is actually used.
+    """
+
+    __slots__ = FIELDS + ("public_context", "p_context", "q_context")
+
+    def __init__(self, p, q, e, d, N, dp, dq, iq):
+        self.p, self.q, self.e, self.d, self.N, self.dp, self.dq, self.iq = p, q, e, d, N, dp, dq, iq
+        self.public_context = self.p_context = self.q_context = None
+
+    @classmethod
+    def from_bytes(cls, data, width):
+        """
+        Decodes a key from a fixed-width record.
+
+        :param data: a bytes-like object of len(FIELDS) * width bytes.
+        :param width: an integer representing the width of every field, in bytes.
+        :return: a Key instance.
+        """
+
+        return cls(*(int.from_bytes(data[i:i + width], "big") for i in range(0, len(FIELDS) * width, width)))
+
+    def to_bytes(self, width):
+        """
+        Encodes the key as a fixed-width record.
+
+        :param width: an integer representing the width of every field, in bytes.
+        :return: a bytes object of len(FIELDS) * width bytes.
+        """
+
+        try:
+            return b"".join(value.to_bytes(width, "big") for value in self.astuple())
+        except OverflowError:
+            raise ValueError("Key does not fit in {}-byte fields.".format(width)) from None
+
+    def astuple(self):
+        """
+        :return: a tuple of the key components, in the order returned by generate.
+        """
+
+        return self.p, self.q, self.e, self.d, self.N, self.dp, self.dq, self.iq
+
+    def encrypt(self, m):
+        """
+        Encrypts a single integer with the public key.
+
+        :param m: an integer smaller than N.
+        :return: an integer representing m^e mod N.
+        """
+
+        if self.public_context is None:
+            self.public_context = FixedExponent(self.e, self.N)
+        return self.public_context.exp(m)
+
+    def decrypt(self, c):
+        """
+        Decrypts a single integer with the private key, using the CRT.
+
+        :param c: an integer smaller than N.
+        :return: an integer representing c^d mod N.
+        """
+
+        if self.p_context is None:
+            self.p_context = FixedExponent(self.dp, self.p)
+            self.q_context = FixedExponent(self.dq, self.q)
+        # S_p = c^{d_p} mod p, S_q = c^{d_q} mod q
+        mp = self.p_context.exp(c)
+        mq = self.q_context.exp(c)
+        # S = S_q + q * ((i_q * (S_p - S_q)) mod p)
+        return mq + self.q * ((self.iq * (mp - mq)) % self.p)
+
+    def __eq__(self, other):
+        return isinstance(other, Key) and self.astuple() == other.astuple()
+
+    def __repr__(self):
+        return "Key(N={}...)".format(str(self.N)[:16])
+
+
+def write_keystore(path, keys, width=None):
+    """
+    Writes a new keystore, replacing any existing file.
+
+    :param path: a string representing the path of the keystore.
+    :param keys: an iterable of Key instances or of tuples as returned by generate.
+    :param width: an integer representing the width of every field in bytes, by default the length of the
+    largest modulus.
+    :return: an integer representing the number of keys written.
+    """
+
+    keys = [key if isinstance(key, Key) else Key(*key) for key in keys]
+    if width is None:
+        if not keys:
+            raise ValueError("The field width of an empty keystore must be given.")
+        width = max((key.N.bit_length() + 7) // 8 for key in keys)
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(FIELDS), width))
+        for key in keys:
+            f.write(key.to_bytes(width))
+    return len(keys)
+
+
+def append_keys(path, keys):
+    """
+    Appends keys to an existing keystore.
+
+    :param path: a string representing the path of the keystore.
+    :param keys: an iterable of Key instances or of tuples as returned by generate.
+    :return: an integer representing the number of keys appended.
+    """
+
+    with open(path, "rb") as f:
+        width = read_header(f.read(HEADER.size))
+    count = 0
+    with open(path, "ab") as f:
+        for key in keys:
+            f.write((key if isinstance(key, Key) else Key(*key)).to_bytes(width))
+            count += 1
+    return count
+
+
+def read_header(data):
+    """
+    Utility function that validates a keystore header.
+
+    :param data: a bytes-like object holding at least the header.
+    :return: an integer representing the width of every field, in bytes.
+    """
+
+    if len(data) < HEADER.size:
+        raise ValueError("Not a keystore: file too short.")
+    magic, version, fields, width = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION or fields != len(FIELDS):
+        raise ValueError("Not a version {} keystore.".format(VERSION))
+    return width
+
+
+class Keystore:
+    """
+    Read-only, memory-mapped view of a keystore.
+
+    Every key is a fixed-width record, so the i-th key is decoded straight from its offset without reading the
+    rest of the file.
+    """
+
+    def __init__(self, path):
+        """
+        :param path: a string representing the path of the keystore.
+        """
+
+        self.file = open(path, "rb")
+        try:
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.width = read_header(self.map)
+        except (ValueError, OSError):
+            self.file.close()
+            raise
+        self.record = len(FIELDS) * self.width
+
+    def __len__(self):
+        return (len(self.map) - HEADER.size) // self.record if self.record else 0
+
+    def __getitem__(self, index):
+        """
+        Loads a single key.
+
+        :param index: an integer representing the position of the key, negative values count from the end.
+        :return: a Key instance.
+        """
+
+        count = len(self)
+        if index < 0:
+            index += count
+        if not 0 <= index < count:
+            raise IndexError("Keystore index out of range.")
+        offset = HEADER.size + index * self.record
+        return Key.from_bytes(self.map[offset:offset + self.record], self.width)
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+if __name__ == '__main__':
+    import importlib
+    import os
+    import tempfile
+    import time
+
+    # crt-rsa is not a valid module name, so it is imported by its file name.
+    crt_rsa = importlib.import_module("crt-rsa")
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "keys.bin")
+        write_keystore(path, [crt_rsa.generate(512) for _ in range(10)])
+        print("Keystore written to {} ({} bytes).".format(path, os.path.getsize(path)))
+
+        start = time.perf_counter()
+        with Keystore(path) as store:
+            key = store[7]
+            print("Loaded key 7 of {} in {:.3f} ms.".format(len(store), 1000 * (time.perf_counter() - start)))
+            message = 123456789
+            print("Decryption of the encrypted message: {}".format(key.decrypt(key.encrypt(message))))
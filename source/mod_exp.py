@@ -1,3 +1,357 @@
+import functools
+import random
+import timeit
+
+# Reduction strategies supported by ModContext.
+REDUCTIONS = ("plain", "montgomery", "barrett")
+# Exponents up to this length (bitwise) are evaluated with an addition chain instead of sliding windows.
+SMALL_EXPONENT_BITS = 32
+
+
+def window_size(bits):
+    """
+    Utility function that picks the sliding window width for an exponent of the given length.
+
+    :param bits: an integer representing the length (bitwise) of the exponent.
+    :return: an integer representing the window width, in bits.
+    """
+
+    # Same thresholds as OpenSSL's BN_window_bits_for_exponent_size.
+    if bits > 671:
+        return 6
+    if bits > 239:
+        return 5
+    if bits > 79:
+        return 4
+    if bits > 23:
+        return 3
+    return 1
+
+
+def sliding_windows(g, w):
+    """
+    Utility function that recodes an exponent into sliding windows, from the most significant bit downwards.
+
+    :param g: a positive integer representing the exponent to be recoded.
+    :param w: an integer representing the maximum width of a window.
+    :return: a list of (value, length) pairs, where value is either 0 (a single zero bit) or an odd integer
+    spanning length bits.
+    """
+
+    bits = bin(g)[2:]
+    windows = []
+    i, n = 0, len(bits)
+    while i < n:
+        if bits[i] == '0':
+            windows.append((0, 1))
+            i += 1
+            continue
+        # Take the longest window of at most w bits that ends with a 1.
+        j = min(i + w, n)
+        while bits[j - 1] == '0':
+            j -= 1
+        windows.append((int(bits[i:j], 2), j - i))
+        i = j
+    return windows
+
+
+def addition_chain(g):
+    """
+    Utility function that builds the binary addition chain of a small exponent, such as 65537 = 2^16 + 1.
+
+    :param g: a positive integer representing the exponent.
+    :return: a list of steps after the first one, where False squares the running value and True multiplies it
+    by the base.
+    """
+
+    chain = []
+    for bit in bin(g)[3:]:
+        chain.append(False)
+        if bit == '1':
+            chain.append(True)
+    return chain
+
+
+class ModContext:
+    """
+    A reusable context for modular exponentiation under a fixed modulus N.
+
+    Everything that only depends on N (Montgomery or Barrett constants) is computed once, so that every
+    exponentiation under the same modulus only pays for its own squarings and multiplications.
+    """
+
+    def __init__(self, N, reduction="plain"):
+        """
+        :param N: an integer representing the modulus of the context.
+        :param reduction: a string among "plain" (Python's built-in remainder), "montgomery" and "barrett".
+        """
+
+        if N < 1:
+            raise ValueError("The modulus must be a positive integer.")
+        if reduction not in REDUCTIONS:
+            raise ValueError("Unknown reduction '{}', expected one of {}.".format(reduction, REDUCTIONS))
+
+        self.N = N
+        self.reduction = reduction
+        self.k = N.bit_length()
+
+        if reduction == "montgomery":
+            if N % 2 == 0:
+                raise ValueError("Montgomery reduction requires an odd modulus.")
+            # R = 2^k > N, N' = -N^-1 mod R
+            self.R = 1 << self.k
+            self.mask = self.R - 1
+            self.N_prime = (-pow(N, -1, self.R)) & self.mask
+        elif reduction == "barrett":
+            # mu = floor(4^k / N)
+            self.mu = (1 << (2 * self.k)) // N
+
+    def reduce(self, T):
+        """
+        Reduces a product of two elements of the context back into the context.
+
+        :param T: a non negative integer smaller than N^2 (or N*R for Montgomery).
+        :return: an integer representing T mod N (T * R^-1 mod N for Montgomery).
+        """
+
+        if self.reduction == "montgomery":
+            # m = (T mod R) * N' mod R, t = (T + m*N) / R
+            m = ((T & self.mask) * self.N_prime) & self.mask
+            t = (T + m * self.N) >> self.k
+            return t - self.N if t >= self.N else t
+        if self.reduction == "barrett":
+            # q = floor(floor(T / 2^(k-1)) * mu / 2^(k+1)), r = T - q*N
+            q = ((T >> (self.k - 1)) * self.mu) >> (self.k + 1)
+            r = T - q * self.N
+            while r >= self.N:
+                r -= self.N
+            return r
+        return T % self.N
+
+    def to_domain(self, a):
+        """
+        Maps an integer into the representation used by the context.
+
+        :param a: an integer.
+        :return: an integer representing a inside the context.
+        """
+
+        if self.reduction == "montgomery":
+            return (a << self.k) % self.N
+        return a % self.N
+
+    def from_domain(self, x):
+        """
+        Maps an element of the context back to an ordinary residue modulo N.
+
+        :param x: an integer representing an element of the context.
+        :return: an integer in the range [0, N).
+        """
+
+        if self.reduction == "montgomery":
+            return self.reduce(x)
+        return x
+
+    def odd_powers(self, x, w):
+        """
+        Computes the table of odd powers x, x^3, ..., x^(2^w - 1) used by the sliding window method.
+
+        :param x: an integer representing an element of the context.
+        :param w: an integer representing the window width.
+        :return: a list where the i-th element is x^(2i + 1).
+        """
+
+        table = [x]
+        if w > 1:
+            x2 = self.reduce(x * x)
+            for _ in range((1 << (w - 1)) - 1):
+                table.append(self.reduce(table[-1] * x2))
+        return table
+
+    def exp(self, a, g):
+        """
+        Calculates a^g mod N using left-to-right sliding window exponentiation.
+
+        :param a: an integer representing the base factor of the calculation.
+        :param g: an integer representing the exponent factor of the calculation.
+        :return: an integer representing the modular exponentiation result equal to a^g mod N.
+        """
+
+        if g < 0:
+            a, g = pow(a, -1, self.N), -g
+        if g == 0:
+            return 1 % self.N
+
+        w = window_size(g.bit_length())
+        return self.exp_windows(a, sliding_windows(g, w), w)
+
+    def exp_windows(self, a, windows, w):
+        """
+        Calculates a^g mod N for an exponent g that has already been recoded into sliding windows.
+
+        :param a: an integer representing the base factor of the calculation.
+        :param windows: a non empty list of (value, length) pairs, as returned by sliding_windows.
+        :param w: an integer representing the window width used for the recoding.
+        :return: an integer representing the modular exponentiation result equal to a^g mod N.
+        """
+
+        table = self.odd_powers(self.to_domain(a), w)
+
+        # The most significant window always starts with a 1, so it seeds the result directly.
+        value, _ = windows[0]
+        d = table[value >> 1]
+        reduce = self.reduce
+        for value, length in windows[1:]:
+            for _ in range(length):
+                d = reduce(d * d)
+            if value:
+                d = reduce(d * table[value >> 1])
+        return self.from_domain(d)
+
+
+class FixedExponent:
+    """
+    Precomputed exponentiation context for many bases raised to the same exponent under the same modulus,
+    such as encrypting a whole message with one public key.
+
+    The exponent is recoded once and the modulus context is shared, so every call only pays for its own
+    odd power table and the squarings of the sliding window method. Small exponents, such as the usual public
+    exponents, skip the window machinery and run their addition chain directly.
+    """
+
+    def __init__(self, g, N, reduction="plain"):
+        """
+        :param g: an integer representing the fixed exponent.
+        :param N: an integer representing the fixed modulus.
+        :param reduction: a string representing the reduction strategy of the underlying context.
+        """
+
+        self.context = get_context(N, reduction)
+        self.negative = g < 0
+        self.g = abs(g)
+        self.w = window_size(self.g.bit_length())
+        self.windows = sliding_windows(self.g, self.w) if self.g else []
+        self.chain = addition_chain(self.g) if 0 < self.g.bit_length() <= SMALL_EXPONENT_BITS else None
+
+    def exp(self, a):
+        """
+        Calculates a^g mod N for the fixed exponent and modulus of the context.
+
+        :param a: an integer representing the base factor of the calculation.
+        :return: an integer representing the modular exponentiation result equal to a^g mod N.
+        """
+
+        N = self.context.N
+        if self.negative:
+            a = pow(a, -1, N)
+        if not self.windows:
+            return 1 % N
+        if self.chain is not None:
+            a %= N
+            x = a
+            for multiply in self.chain:
+                x = x * (a if multiply else x) % N
+            return x
+        return self.context.exp_windows(a, self.windows, self.w)
+
+
+class FixedBase:
+    """
+    Precomputed exponentiation context for one base raised to many exponents under the same modulus,
+    such as testing candidate exponents during an attack.
+
+    Implements Yao's fixed-base windowing: the powers a^(2^(w*i)) are stored once, after which every
+    exponentiation costs about bits/w + 2^w multiplications and no squarings. The table holds at most
+    max_bits/w residues and grows lazily up to that bound; longer exponents fall back to the sliding
+    window method.
+    """
+
+    def __init__(self, a, N, max_bits=None, w=None, reduction="plain"):
+        """
+        :param a: an integer representing the fixed base.
+        :param N: an integer representing the fixed modulus.
+        :param max_bits: an integer bounding the length (bitwise) of the exponents served from the table,
+        by default twice the length of N.
+        :param w: an integer representing the window width, by default the one that minimizes the cost
+        for max_bits long exponents.
+        :param reduction: a string representing the reduction strategy of the underlying context.
+        """
+
+        self.context = get_context(N, reduction)
+        self.a = a % N
+        self.max_bits = max_bits if max_bits is not None else 2 * N.bit_length()
+        if w is None:
+            w = min(range(1, 17), key=lambda x: -(-self.max_bits // x) + (1 << x))
+        self.w = w
+        # table[i] = a^(2^(w*i)) inside the context.
+        self.table = [self.context.to_domain(self.a)]
+
+    def extend(self, digits):
+        """
+        Grows the table of powers until it covers the given number of digits.
+
+        :param digits: an integer representing the number of w-bit digits that must be covered.
+        """
+
+        reduce = self.context.reduce
+        while len(self.table) < digits:
+            x = self.table[-1]
+            for _ in range(self.w):
+                x = reduce(x * x)
+            self.table.append(x)
+
+    def exp(self, g):
+        """
+        Calculates a^g mod N for the fixed base and modulus of the context.
+
+        :param g: an integer representing the exponent factor of the calculation.
+        :return: an integer representing the modular exponentiation result equal to a^g mod N.
+        """
+
+        context = self.context
+        if g < 0 or g.bit_length() > self.max_bits:
+            return context.exp(self.a, g)
+        if g == 0:
+            return 1 % context.N
+
+        # Split g into w-bit digits g = sum(g_i * 2^(w*i)).
+        w, mask = self.w, (1 << self.w) - 1
+        digits = []
+        while g:
+            digits.append(g & mask)
+            g >>= w
+        self.extend(len(digits))
+
+        # Group the stored powers by digit value.
+        buckets = [[] for _ in range(mask + 1)]
+        for i, digit in enumerate(digits):
+            if digit:
+                buckets[digit].append(self.table[i])
+
+        # a^g = prod_j (prod_{g_i = j} a^(2^(w*i)))^j, computed as a running product from the largest j down.
+        reduce = context.reduce
+        A = B = None
+        for j in range(mask, 0, -1):
+            for x in buckets[j]:
+                B = x if B is None else reduce(B * x)
+            if B is not None:
+                A = B if A is None else reduce(A * B)
+        return context.from_domain(A)
+
+
+@functools.lru_cache(maxsize=64)
+def get_context(N, reduction="plain"):
+    """
+    Utility function that returns the cached context of a modulus, building it the first time it is needed.
+
+    :param N: an integer representing the modulus.
+    :param reduction: a string representing the reduction strategy of the context.
+    :return: a ModContext instance for the given modulus.
+    """
+
+    return ModContext(N, reduction)
+
+
 def fast(a, g, N):
     """
     Implements a fast algorithm that calculates the modular exponentiation
@@ -8,6 +362,20 @@ def fast(a, g, N):
     :param N: an integer representing the modulus factor of the calculation.
     :return: an integer representing the modular exponentiation result equal to a^g mod N.
     """
+
+    return get_context(N).exp(a, g)
+
+
+def fast_binary(a, g, N):
+    """
+    The original right-to-left binary algorithm, kept as a reference point for benchmarking.
+
+    :param a: an integer representing the base factor of the calculation.
+    :param g: an integer representing the exponent factor of the calculation.
+    :param N: an integer representing the modulus factor of the calculation.
+    :return: an integer representing the modular exponentiation result equal to a^g mod N.
+    """
+
     # g = (g_n g_n-1 ... g_0)_2
     g = bin(g).replace("0b", "")[::-1]
     # x <- a, d <- 1
@@ -24,6 +392,37 @@ def fast(a, g, N):
     return d
 
 
+def benchmark(bits=2048, trials=10):
+    """
+    Compares the binary loop, the sliding window engine under every reduction, the built-in pow and a
+    fixed-base table.
+
+    :param bits: an integer representing the length (bitwise) of the modulus, base and exponent.
+    :param trials: an integer representing the number of exponentiations timed per method.
+    :return: a dictionary that maps every method to its average time per exponentiation, in seconds.
+    """
+
+    N = random.getrandbits(bits) | (1 << (bits - 1)) | 1
+    args = [(random.randrange(N), random.getrandbits(bits)) for _ in range(trials)]
+
+    methods = {"binary loop": lambda a, g: fast_binary(a, g, N)}
+    for reduction in REDUCTIONS:
+        context = ModContext(N, reduction)
+        methods["window/" + reduction] = context.exp
+    methods["built-in pow"] = lambda a, g: pow(a, g, N)
+    # The fixed-base table is built outside the timed region, as it is shared by every call.
+    fixed_base = FixedBase(args[0][0], N, max_bits=bits)
+    fixed_base.extend(-(-bits // fixed_base.w))
+    methods["fixed base"] = lambda a, g: fixed_base.exp(g)
+
+    results = {}
+    for name, method in methods.items():
+        elapsed = timeit.timeit(lambda: [method(a, g) for a, g in args], number=1)
+        results[name] = elapsed / trials
+        print("{:>20}: {:10.3f} ms per exponentiation".format(name, 1000 * results[name]))
+    return results
+
+
 if __name__ == '__main__':
     print("2 ^ 1234567 mod 12345 = {}".format(str(fast(2, 1234567, 12345))))
     print("130 ^ 7654321 mod 567 = {}".format(str(fast(130, 7654321, 567))))
@@ -31,3 +430,6 @@ if __name__ == '__main__':
     c = [3203, 909, 3143, 5255, 5343, 3203, 909, 9958, 5278, 5343, 9958, 5278, 4674, 909, 9958, 792, 909, 4132, 3143, 9958, 3203, 5343, 792, 3143, 4443]
     for i in range(len(c)):
         print(chr(fast(c[i], 1179, 11413)), end="")
+    print()
+
+    benchmark()
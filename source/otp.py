@@ -1,4 +1,19 @@
-import random
+import contextlib
+import mmap
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from csprng import symbols
+
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
+    import msvcrt
 
 # Substitution matrix used to transform a given message to a corresponding binary representation.
 MATRIX = {"A": "00000", "B": "00001", "C": "00010", "D": "00011", "E": "00100", "F": "00101", "G": "00110",
@@ -7,6 +22,45 @@ MATRIX = {"A": "00000", "B": "00001", "C": "00010", "D": "00011", "E": "00100",
           "V": "10101", "W": "10110", "X": "10111", "Y": "11000", "Z": "11001", ".": "11010", "!": "11011",
           "?": "11100", "(": "11101", ")": "11110", "-": "11111"}
 
+# Number of file bytes mapped at once by the streaming mode, a multiple of the mmap allocation granularity.
+WINDOW_SIZE = (1 << 24) // mmap.ALLOCATIONGRANULARITY * mmap.ALLOCATIONGRANULARITY
+# Reverse table: the symbol of every 5-bit code, as ASCII bytes.
+DECODE = np.zeros(32, dtype=np.uint8)
+# Lookup table: the 5-bit code of every byte, 0xFF for bytes outside of the alphabet.
+ENCODE = np.full(256, 0xFF, dtype=np.uint8)
+for symbol, bits in MATRIX.items():
+    DECODE[int(bits, 2)] = ord(symbol)
+    ENCODE[ord(symbol)] = int(bits, 2)
+
+
+def encode(m):
+    """
+    Converts a message to its 5-bit codes, one code per byte.
+
+    :param m: a string or an ASCII bytes-like object made of symbols of MATRIX.
+    :return: a NumPy uint8 array holding the code of every symbol.
+    """
+
+    if isinstance(m, str):
+        if not m.isascii():
+            raise ValueError("The message contains symbols outside of the OTP alphabet.")
+        m = m.encode("ascii")
+    codes = ENCODE[np.frombuffer(m, dtype=np.uint8)]
+    if (codes == 0xFF).any():
+        raise ValueError("The message contains symbols outside of the OTP alphabet.")
+    return codes
+
+
+def decode(codes):
+    """
+    Converts 5-bit codes back to their message.
+
+    :param codes: a NumPy uint8 array of codes smaller than 32.
+    :return: a string representing the message.
+    """
+
+    return DECODE[codes].tobytes().decode("ascii")
+
 
 def toBitString(m):
     """
@@ -16,10 +70,7 @@ def toBitString(m):
     :return: a string representing the binary equivalent to the message given to the function.
     """
 
-    for k, v in MATRIX.items():
-        if k in m:
-            m = m.replace(k, v)
-    return m
+    return "".join(MATRIX[c] for c in m)
 
 
 def toString(b):
@@ -27,15 +78,13 @@ def toString(b):
     Utility function used to convert a binary representation to its corresponding message.
 
     :param b: a string representing a given binary.
-    :return: a string representing the message equivalent to the binary given to the function.
+    :return: a string representing the message equivalent to the binary given to the function, one symbol per
+    group of 5 bits, separated by spaces.
     """
 
-    # Isolate each character as a group of 5 bits.
-    b_s = ' '.join([b[i:i+5] for i in range(0, len(b), 5)])
-    for k, v in MATRIX.items():
-        if v in b_s:
-            b_s = b_s.replace(v, k)
-    return b_s
+    if len(b) % 5 or set(b) - {"0", "1"}:
+        raise ValueError("The binary must be made of groups of 5 bits.")
+    return " ".join(chr(DECODE[int(b[i:i + 5], 2)]) for i in range(0, len(b), 5))
 
 
 def bitwise_xor(a, b):
@@ -47,34 +96,213 @@ def bitwise_xor(a, b):
     :return: the result produced by XORing the two strings given as parameters.
     """
 
-    result = ""
-    for i in range(0, len(a)):
-        result += str(int(a[i]) ^ int(b[i]))
-    return result
+    if not a:
+        return ""
+    return format(int(a, 2) ^ int(b[:len(a)], 2), "0{}b".format(len(a)))
 
 
 def OTP(k, m):
     """
     Function implementing the OTP encryption algorithm.
 
-    :param k: a string representing the key that is used during the encryption process.
+    :param k: a string representing the key that is used during the encryption process, at least as long as m.
     :param m: a string representing the message that is going to be encrypted.
     :return: a string representing the ciphertext produced by the encryption process.
     """
 
-    # Use XOR after the conversion to bit strings.
-    c = bitwise_xor(toBitString(m), toBitString(k))
-    return toString(c).replace(" ", "")
+    if len(k) < len(m):
+        raise ValueError("The key must be at least as long as the message.")
+    # Use XOR on the 5-bit codes of the whole message at once.
+    c = encode(m)
+    np.bitwise_xor(c, encode(k[:len(m)]), out=c)
+    return decode(c)
+
+
+def generate_key(length):
+    """
+    Utility function that draws a random key from a cryptographically secure source.
+
+    :param length: an integer representing the number of symbols of the key.
+    :return: a string of random symbols of MATRIX.
+    """
+
+    return symbols("".join(MATRIX), length)
+
+
+def generate_pad(path, size, chunk_size=1 << 20):
+    """
+    Writes a new pad of random bytes, replacing any existing pad and its offset record.
+
+    :param path: a string representing the path of the pad.
+    :param size: an integer representing the length of the pad, in bytes.
+    :param chunk_size: an integer representing the number of bytes drawn at once.
+    """
+
+    with open(path, "wb") as f:
+        for start in range(0, size, chunk_size):
+            f.write(os.urandom(min(chunk_size, size - start)))
+    if os.path.exists(path + ".offset"):
+        os.remove(path + ".offset")
+
+
+def read_offset(pad):
+    """
+    Utility function that reads how much of a pad has been consumed.
+
+    :param pad: a string representing the path of the pad.
+    :return: an integer representing the offset of the first unused byte of the pad.
+    """
+
+    record = pad + ".offset"
+    if not os.path.exists(record):
+        return 0
+    with open(record) as f:
+        return int(f.read() or 0)
+
+
+@contextlib.contextmanager
+def pad_lock(pad):
+    """
+    Utility context manager that holds an exclusive lock on a pad, across processes, through the file <pad>.lock.
+    The lock is released by the operating system if the process dies.
+
+    :param pad: a string representing the path of the pad.
+    """
+
+    with open(pad + ".lock", "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def reserve(pad, n):
+    """
+    Consumes the next bytes of a pad. The new offset is on disk before the bytes are used, so that they are never
+    used twice, even if the encryption is interrupted or several processes encrypt with the same pad.
+
+    :param pad: a string representing the path of the pad.
+    :param n: an integer representing the number of bytes to consume.
+    :return: an integer representing the offset of the first reserved byte.
+    """
+
+    record = pad + ".offset"
+    with pad_lock(pad):
+        offset = read_offset(pad)
+        if offset + n > os.path.getsize(pad):
+            raise ValueError("The pad has only {} unused bytes left.".format(os.path.getsize(pad) - offset))
+        # Replace the record atomically and durably, through a temporary file of its own.
+        descriptor, temporary = tempfile.mkstemp(prefix=os.path.basename(record) + ".",
+                                                 dir=os.path.dirname(os.path.abspath(record)))
+        try:
+            with os.fdopen(descriptor, "w") as f:
+                f.write(str(offset + n))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temporary, record)
+        except BaseException:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            raise
+    return offset
+
+
+def xor_file(pad, source, destination, offset, window=WINDOW_SIZE):
+    """
+    XORs a file with a region of a pad with constant memory. The pad, the input and the output are memory-mapped
+    one window at a time and XORed straight from one mapping into the other.
+
+    :param pad: a string representing the path of the pad.
+    :param source: a string representing the path of the input file.
+    :param destination: a string representing the path of the output file, replaced if it exists.
+    :param offset: an integer representing the position in the pad of the byte used for the first byte of the file.
+    :param window: an integer representing the number of bytes mapped at once, rounded up to a multiple of the
+    mmap allocation granularity.
+    :return: an integer representing the number of bytes processed.
+    """
+
+    granularity = mmap.ALLOCATIONGRANULARITY
+    window = max(granularity, -(-window // granularity) * granularity)
+    size = os.path.getsize(source)
+    if offset + size > os.path.getsize(pad):
+        raise ValueError("The pad is too short for the file.")
+
+    with open(pad, "rb") as fpad, open(source, "rb") as fin, open(destination, "w+b") as fout:
+        fout.truncate(size)
+        for start in range(0, size, window):
+            length = min(window, size - start)
+            # Pad mappings must start at a multiple of the granularity as well.
+            position = offset + start
+            aligned = position - position % granularity
+            with mmap.mmap(fpad.fileno(), position - aligned + length, offset=aligned,
+                           access=mmap.ACCESS_READ) as key, \
+                    mmap.mmap(fin.fileno(), length, offset=start, access=mmap.ACCESS_READ) as src, \
+                    mmap.mmap(fout.fileno(), length, offset=start, access=mmap.ACCESS_WRITE) as dst:
+                np.bitwise_xor(np.frombuffer(src, dtype=np.uint8),
+                               np.frombuffer(key, dtype=np.uint8, count=length, offset=position - aligned),
+                               out=np.frombuffer(dst, dtype=np.uint8))
+    return size
+
+
+def encrypt_file(pad, source, destination):
+    """
+    Encrypts a file with the next unused bytes of a pad.
+
+    :param pad: a string representing the path of the pad.
+    :param source: a string representing the path of the plaintext.
+    :param destination: a string representing the path of the ciphertext.
+    :return: an integer representing the pad offset that is needed to decrypt the file.
+    """
+
+    offset = reserve(pad, os.path.getsize(source))
+    xor_file(pad, source, destination, offset)
+    return offset
+
+
+def decrypt_file(pad, source, destination, offset):
+    """
+    Decrypts a file encrypted by encrypt_file. The pad is not consumed again.
+
+    :param pad: a string representing the path of the pad.
+    :param source: a string representing the path of the ciphertext.
+    :param destination: a string representing the path of the plaintext.
+    :param offset: an integer representing the pad offset returned by encrypt_file.
+    :return: an integer representing the number of bytes processed.
+    """
+
+    return xor_file(pad, source, destination, offset)
+
+
+def benchmark(size=1 << 22):
+    """
+    Measures the throughput of the OTP engine.
+
+    :param size: an integer representing the number of symbols to be encrypted.
+    :return: a float representing the throughput, in MB per second.
+    """
+
+    m, k = generate_key(size), generate_key(size)
+    start = time.perf_counter()
+    OTP(k, m)
+    rate = size / (time.perf_counter() - start) / 1e6
+    print("OTP: {:.2f} MB/s".format(rate))
+    return rate
 
 
 if __name__ == '__main__':
     original_message = "WE ALL MAKE MISTAKES AND WE ALL PAY A PRICE".replace(" ", "")
 
     # Encryption and decryption done using a randomly generated key
-    key = ""
-    keys = list(MATRIX)
-    for i in range(len(original_message)):
-        key += keys[random.randint(0, len(keys) - 1)]
+    key = generate_key(len(original_message))
 
     ciphertext = OTP(key, original_message)
 
@@ -83,3 +311,20 @@ if __name__ == '__main__':
     print("The cypher given after OTP encryption: {}".format(ciphertext))
     print("The message given after OTP decryption: {}".format(OTP(key, ciphertext)))
 
+    benchmark()
+
+    with tempfile.TemporaryDirectory() as directory:
+        pad, plain, encrypted, decrypted = (os.path.join(directory, name)
+                                            for name in ("pad", "plain", "encrypted", "decrypted"))
+        generate_pad(pad, 3 << 24)
+        with open(plain, "wb") as f:
+            f.write(os.urandom(1 << 24))
+        for _ in range(2):
+            start = time.perf_counter()
+            offset = encrypt_file(pad, plain, encrypted)
+            rate = (1 << 24) / (time.perf_counter() - start) / 1e6
+            print("Encrypted 16 MiB at pad offset {} ({:.2f} MB/s).".format(offset, rate))
+        decrypt_file(pad, encrypted, decrypted, offset)
+        with open(plain, "rb") as f, open(decrypted, "rb") as g:
+            print("File decryption successful: {}".format(f.read() == g.read()))
+        print("Unused pad bytes left: {}".format(os.path.getsize(pad) - read_offset(pad)))
@@ -0,0 +1,123 @@
+import hashlib
+import os
+
+# Hash function used by OAEP and its mask generation function.
+HASH = hashlib.sha256
+HASH_LEN = HASH().digest_size
+
+
+def mgf1(seed, length):
+    """
+    Implements the MGF1 mask generation function of PKCS #1.
+
+    :param seed: a bytes object from which the mask is generated.
+    :param length: an integer representing the length of the mask, in bytes.
+    :return: a bytes object of the desired length.
+    """
+
+    mask = bytearray()
+    counter = 0
+    while len(mask) < length:
+        mask += HASH(seed + counter.to_bytes(4, "big")).digest()
+        counter += 1
+    return bytes(mask[:length])
+
+
+def xor(a, b):
+    """
+    Utility function that XORs two byte strings of the same length.
+
+    :param a: the first bytes object.
+    :param b: the second bytes object.
+    :return: a bytes object equal to a XOR b.
+    """
+
+    return (int.from_bytes(a, "big") ^ int.from_bytes(b, "big")).to_bytes(len(a), "big")
+
+
+def capacity(k):
+    """
+    Utility function that returns how many message bytes fit in one OAEP block.
+
+    :param k: an integer representing the length of the modulus, in bytes.
+    :return: an integer representing the largest message length, in bytes.
+    """
+
+    return k - 2 * HASH_LEN - 2
+
+
+def oaep_encode(message, k, label=b""):
+    """
+    Implements the EME-OAEP encoding of PKCS #1 v2.2.
+
+    :param message: a bytes object of at most capacity(k) bytes.
+    :param k: an integer representing the length of the modulus, in bytes.
+    :param label: a bytes object bound to the encoding.
+    :return: a bytes object of k bytes, ready to be converted to an integer and encrypted.
+    """
+
+    if len(message) > capacity(k):
+        raise ValueError("Message too long for a {}-byte modulus.".format(k))
+
+    # DB = lHash || PS || 0x01 || M
+    db = HASH(label).digest() + bytes(capacity(k) - len(message)) + b"\x01" + message
+    seed = os.urandom(HASH_LEN)
+    masked_db = xor(db, mgf1(seed, len(db)))
+    masked_seed = xor(seed, mgf1(masked_db, HASH_LEN))
+    # EM = 0x00 || maskedSeed || maskedDB
+    return b"\x00" + masked_seed + masked_db
+
+
+def oaep_decode(block, k, label=b""):
+    """
+    Implements the EME-OAEP decoding of PKCS #1 v2.2.
+
+    :param block: a bytes object of k bytes, as produced by oaep_encode.
+    :param k: an integer representing the length of the modulus, in bytes.
+    :param label: a bytes object bound to the encoding.
+    :return: a bytes object representing the original message.
+    """
+
+    if len(block) != k or k < 2 * HASH_LEN + 2:
+        raise ValueError("Decryption error.")
+
+    masked_seed, masked_db = block[1:1 + HASH_LEN], block[1 + HASH_LEN:]
+    seed = xor(masked_seed, mgf1(masked_db, HASH_LEN))
+    db = xor(masked_db, mgf1(seed, len(masked_db)))
+
+    # Every check is combined so that a failure does not reveal which part was wrong.
+    separator = db.find(b"\x01", HASH_LEN)
+    valid = block[0] == 0 and db[:HASH_LEN] == HASH(label).digest() and separator != -1
+    valid = valid and not any(db[HASH_LEN:separator])
+    if not valid:
+        raise ValueError("Decryption error.")
+    return db[separator + 1:]
+
+
+def read_blocks(source, size):
+    """
+    Utility function that splits a message into consecutive blocks of a fixed size.
+
+    :param source: a str, a bytes-like object, a binary file object or an iterable of bytes chunks.
+    :param size: an integer representing the length of a block, in bytes.
+    :return: a generator of bytes objects of size bytes, except for the last one that may be shorter.
+    """
+
+    if size < 1:
+        raise ValueError("The block size must be positive.")
+    if isinstance(source, str):
+        source = source.encode()
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        for i in range(0, len(source), size):
+            yield bytes(source[i:i + size])
+        return
+
+    chunks = iter(lambda: source.read(size), b"") if hasattr(source, "read") else source
+    buffer = bytearray()
+    for chunk in chunks:
+        buffer += chunk
+        while len(buffer) >= size:
+            yield bytes(buffer[:size])
+            del buffer[:size]
+    if buffer:
+        yield bytes(buffer)
@@ -0,0 +1,259 @@
+import math
+import random
+
+from mod_exp import fast
+from sieve import SIEVE_BOUND, STATS, trial_division
+
+# Primality modes understood by the is_prime functions of the repository.
+MODES = ("random", "tuned", "deterministic", "bpsw")
+
+# Bases that make the Miller-Rabin test deterministic for every n smaller than the bound.
+# Sources: Jaeschke (1993), Jiang and Deng (2014), Sorenson and Webster (2015).
+DETERMINISTIC_BASES = [
+    (2047, (2,)),
+    (1373653, (2, 3)),
+    (9080191, (31, 73)),
+    (25326001, (2, 3, 5)),
+    (3215031751, (2, 3, 5, 7)),
+    (4759123141, (2, 7, 61)),
+    (1122004669633, (2, 13, 23, 1662803)),
+    (2152302898747, (2, 3, 5, 7, 11)),
+    (3474749660383, (2, 3, 5, 7, 11, 13)),
+    (341550071728321, (2, 3, 5, 7, 11, 13, 17)),
+    (3825123056546413051, (2, 3, 5, 7, 11, 13, 17, 19, 23)),
+    (318665857834031151167461, (2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37)),
+    (3317044064679887385961981, (2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41)),
+]
+
+
+def deterministic_bases(n):
+    """
+    Utility function that looks up a set of bases for which the Miller-Rabin test is deterministic.
+
+    :param n: an odd integer greater than 3 that is going to be tested for primality.
+    :return: a tuple of bases if n lies below a known bound, None otherwise.
+    """
+
+    for bound, bases in DETERMINISTIC_BASES:
+        if n < bound:
+            # A base that is a multiple of n says nothing about n.
+            return tuple(a for a in bases if a % n)
+    return None
+
+
+def tuned_rounds(bits):
+    """
+    Utility function that returns the number of Miller-Rabin rounds needed for a random candidate of the given length.
+
+    The counts follow OpenSSL's table, which keeps the error probability for random odd candidates below 2^-128
+    (Damgard, Landrock and Pomerance, 1993). They are not meant for adversarially chosen inputs.
+
+    :param bits: an integer representing the length (bitwise) of the candidate.
+    :return: an integer representing the number of rounds.
+    """
+
+    if bits >= 3747:
+        return 3
+    if bits >= 1345:
+        return 4
+    if bits >= 476:
+        return 5
+    if bits >= 400:
+        return 6
+    if bits >= 347:
+        return 7
+    if bits >= 308:
+        return 8
+    if bits >= 55:
+        return 27
+    return 34
+
+
+def strong_test(n, a):
+    """
+    Implements a single round of the Miller-Rabin test with a chosen base.
+
+    :param n: an odd integer greater than 3 that is going to be tested for primality.
+    :param a: an integer representing the base of the test.
+    :return: True if n is a strong probable prime to base a, False otherwise.
+    """
+
+    # n - 1 = 2^k * q, q odd
+    k, q = 0, n - 1
+    while q % 2 == 0:
+        k += 1
+        q //= 2
+
+    x = fast(a, q, n)
+    if x == 1 or x == n - 1:
+        return True
+    for _ in range(k - 1):
+        x = x * x % n
+        if x == n - 1:
+            return True
+    return False
+
+
+def jacobi(a, n):
+    """
+    Implements the binary algorithm for the Jacobi symbol (a / n).
+
+    :param a: an integer.
+    :param n: an odd positive integer.
+    :return: an integer among -1, 0 and 1.
+    """
+
+    a %= n
+    result = 1
+    while a:
+        while a % 2 == 0:
+            a //= 2
+            if n % 8 in (3, 5):
+                result = -result
+        # Quadratic reciprocity
+        a, n = n, a
+        if a % 4 == 3 and n % 4 == 3:
+            result = -result
+        a %= n
+    return result if n == 1 else 0
+
+
+def strong_lucas(n):
+    """
+    Implements the strong Lucas probable prime test with Selfridge's parameters.
+
+    :param n: an odd integer greater than 3 that is going to be tested for primality.
+    :return: True if n is a strong Lucas probable prime, False otherwise.
+    """
+
+    # No D with (D / n) = -1 exists for perfect squares.
+    if math.isqrt(n) ** 2 == n:
+        return False
+
+    # Find the first D among 5, -7, 9, -11, ... such that (D / n) = -1.
+    D = 5
+    while True:
+        j = jacobi(D, n)
+        if j == -1:
+            break
+        if j == 0 and abs(D) != n:
+            return False
+        D = -D - 2 if D > 0 else -D + 2
+    P, Q = 1, (1 - D) // 4
+
+    # n + 1 = 2^s * d, d odd
+    s, d = 0, n + 1
+    while d % 2 == 0:
+        s += 1
+        d //= 2
+
+    # Compute U_d, V_d and Q^d by walking the bits of d, starting from U_1 = 1, V_1 = P.
+    U, V, Qk = 1, P, Q % n
+    for bit in bin(d)[3:]:
+        # U_2k = U_k * V_k, V_2k = V_k^2 - 2Q^k
+        U, V, Qk = U * V % n, (V * V - 2 * Qk) % n, Qk * Qk % n
+        if bit == '1':
+            # U_k+1 = (P*U_k + V_k) / 2, V_k+1 = (D*U_k + P*V_k) / 2
+            U, V = P * U + V, D * U + P * V
+            U = (U + n if U % 2 else U) // 2 % n
+            V = (V + n if V % 2 else V) // 2 % n
+            Qk = Qk * Q % n
+
+    if U == 0 or V == 0:
+        return True
+    # V_(d*2^r) = 0 for some 0 < r < s
+    for _ in range(s - 1):
+        V, Qk = (V * V - 2 * Qk) % n, Qk * Qk % n
+        if V == 0:
+            return True
+    return False
+
+
+def bpsw(n):
+    """
+    Implements the Baillie-PSW primality test: a strong test to base 2 followed by a strong Lucas test.
+
+    No composite number is known to pass both tests.
+
+    :param n: an odd integer greater than 3 that is going to be tested for primality.
+    :return: True if the given number is find to be prime, False otherwise.
+    """
+
+    return strong_test(n, 2) and strong_lucas(n)
+
+
+def miller_rabin(n, a=None):
+    """
+    Implements the Miller-Rabin primality test.
+
+    :param n: an odd integer greater than 3 that is going to be tested for primality.
+    :param a: an integer representing the base of the test, a random one is picked if omitted.
+    :return: True if the given number is find to be prime, False otherwise.
+    """
+
+    # Pick a random integer a in the range (1, n-1) or [2, n-2]
+    if a is None:
+        a = random.randint(2, n - 2)
+    return strong_test(n, a)
+
+
+def is_prime(n, bound=SIEVE_BOUND, mode="random"):
+    """
+    Utility function that determines whether a given number is prime or not.
+
+    The mode selects the test run after trial division:
+    - "random": 40 Miller-Rabin rounds with random bases.
+    - "tuned": as many random rounds as the bit length of n requires, which is only sound for random candidates.
+    - "deterministic": fixed bases that are proven to suffice below known bounds, the Baillie-PSW test above them.
+    - "bpsw": the Baillie-PSW test.
+
+    :param n: an integer that is going to be tested for primality.
+    :param bound: an integer representing the bound of the small primes used for trial division.
+    :param mode: a string among "random", "tuned", "deterministic" and "bpsw".
+    :return: True if the given number is find to be prime, False otherwise.
+    """
+
+    if mode not in MODES:
+        raise ValueError("Unknown mode '{}', expected one of {}.".format(mode, MODES))
+
+    # 1 is not considered a prime number
+    if n <= 1:
+        return False
+
+    # 2 and 3 are prime numbers
+    if n <= 3:
+        return True
+
+    # Every even number is composite
+    if n % 2 == 0:
+        STATS["even"] += 1
+        return False
+
+    # Most candidates have a small prime factor, which is far cheaper to find than running Miller-Rabin.
+    if not trial_division(n, bound):
+        STATS["trial division"] += 1
+        return False
+
+    bases = deterministic_bases(n) if mode == "deterministic" else None
+    # Above the known bounds no fixed set of bases is proven, and n may not be a random candidate.
+    if mode == "bpsw" or mode == "deterministic" and bases is None:
+        if not bpsw(n):
+            STATS["bpsw"] += 1
+            return False
+        STATS["accepted"] += 1
+        return True
+
+    if bases is None:
+        # Run the Miller-Rabin test 40 times for each number
+        # Q: Why 40?
+        # A: https://stackoverflow.com/a/6330138
+        rounds = 40 if mode == "random" else tuned_rounds(n.bit_length())
+        bases = rounds * [None]
+    for a in bases:
+        if not miller_rabin(n, a):
+            STATS["miller-rabin"] += 1
+            return False
+
+    # If it passes the test for all iterations, then its a prime number, hopefully.
+    STATS["accepted"] += 1
+    return True
@@ -1,17 +1,168 @@
+import mmap
+import os
+import tempfile
+import time
+
 import numpy as np
 
+# Number of keystream bytes produced and XORed at once.
+CHUNK_SIZE = 1 << 16
+# Number of file bytes mapped at once by the file mode, a multiple of the mmap allocation granularity.
+WINDOW_SIZE = (1 << 24) // mmap.ALLOCATIONGRANULARITY * mmap.ALLOCATIONGRANULARITY
+
+
+def to_bytes(k):
+    """
+    Utility function that converts a key or a message to bytes.
+
+    :param k: a string, whose characters are reduced modulo 256 as in the byte oriented RC4, or a bytes-like object.
+    :return: a bytes object.
+    """
+
+    if isinstance(k, str):
+        return bytes(ord(c) & 0xFF for c in k)
+    return bytes(k)
+
+
+class RC4Stream:
+    """
+    An RC4 stream: the permutation S and the indices i, j are kept between calls, so a long stream can be
+    encrypted piece by piece with update() and produces the same result as encrypting it at once.
+    """
+
+    def __init__(self, k):
+        """
+        Runs the key scheduling algorithm.
+
+        :param k: a string or a bytes-like object of 1 to 256 bytes representing the key.
+        """
+
+        K = to_bytes(k)
+        keylen = len(K)
+        if not 1 <= keylen <= 256:
+            raise ValueError("The key must be between 1 and 256 bytes long.")
+
+        # Initialization
+        S = list(range(256))
+        # Initial Permutations of S
+        j = 0
+        for i in range(256):
+            j = (j + S[i] + K[i % keylen]) & 0xFF
+            S[i], S[j] = S[j], S[i]
+
+        self.S = S
+        self.i = self.j = 0
+
+    def keystream(self, n):
+        """
+        Runs the pseudo random generation algorithm.
+
+        :param n: an integer representing the number of keystream bytes.
+        :return: a bytearray of the next n keystream bytes.
+        """
+
+        S, i, j = self.S, self.i, self.j
+        KS = bytearray(n)
+        for k in range(n):
+            i = (i + 1) & 0xFF
+            si = S[i]
+            j = (j + si) & 0xFF
+            sj = S[j]
+            S[i], S[j] = sj, si
+            KS[k] = S[(si + sj) & 0xFF]
+        self.i, self.j = i, j
+        return KS
+
+    def skip(self, n):
+        """
+        Discards keystream bytes, e.g. the biased first bytes of the keystream or the part of the stream that
+        precedes a given offset.
+
+        :param n: an integer representing the number of keystream bytes to discard.
+        """
+
+        for start in range(0, n, CHUNK_SIZE):
+            self.keystream(min(CHUNK_SIZE, n - start))
+
+    def update_into(self, buffer):
+        """
+        Encrypts (or decrypts) a writable buffer in place, continuing the stream.
+
+        :param buffer: a bytearray, a writable memoryview or any other writable bytes-like object.
+        :return: the buffer given as parameter.
+        """
+
+        view = memoryview(buffer).cast("B")
+        for start in range(0, len(view), CHUNK_SIZE):
+            block = np.frombuffer(view[start:start + CHUNK_SIZE], dtype=np.uint8)
+            np.bitwise_xor(block, np.frombuffer(self.keystream(len(block)), dtype=np.uint8), out=block)
+        return buffer
 
-def swap(a, b):
+    def update(self, data):
+        """
+        Encrypts (or decrypts) the next piece of the stream.
+
+        :param data: a bytes-like object.
+        :return: a bytes object of the same length.
+        """
+
+        return bytes(self.update_into(bytearray(data)))
+
+
+def keystreams(keys, n, drop=0):
     """
-    Utility function used to swap the value of a with b and vice versa.
+    Generates the keystreams of many keys at once.
 
-    :param a: the first value to be swapped.
-    :param b: the second value to be swapped.
+    The state of every key is a row of 2-D arrays, so each of the 256 steps of the key scheduling and each step of
+    the generation runs once for all the keys, and the interpreter overhead is paid per step instead of per key.
+
+    :param keys: a list of strings or bytes-like objects of 1 to 256 bytes representing the keys.
+    :param n: an integer representing the length of every keystream.
+    :param drop: an integer representing the number of keystream bytes discarded first, as in RC4-drop[n].
+    :return: a NumPy uint8 array of shape (len(keys), n) whose rows are the keystreams of the keys.
     """
 
-    temp = a
-    a = b
-    b = temp
+    K = [to_bytes(k) for k in keys]
+    if not all(1 <= len(k) <= 256 for k in K):
+        raise ValueError("The key must be between 1 and 256 bytes long.")
+    count = len(K)
+    # T[b, i] = K_b[i mod len(K_b)], every key repeated over a full row.
+    lengths = np.array([len(k) for k in K], dtype=np.intp)
+    starts = np.zeros(count, dtype=np.intp)
+    np.cumsum(lengths[:-1], out=starts[1:])
+    T = np.frombuffer(b"".join(K), dtype=np.uint8)[starts[:, None] + np.arange(256) % lengths[:, None]]
+
+    # Initialization, S[b] is the permutation of the b-th key. The swaps index the flattened array, S[b, j] being
+    # flat[256 * b + j].
+    S = np.tile(np.arange(256, dtype=np.uint8), (count, 1))
+    flat = S.reshape(-1)
+    base = np.arange(count, dtype=np.intp) * 256
+    # Initial Permutations of S
+    j = np.zeros(count, dtype=np.intp)
+    for i in range(256):
+        si = S[:, i].copy()
+        j += si
+        j += T[:, i]
+        j &= 0xFF
+        index = base + j
+        S[:, i] = flat.take(index)
+        flat.put(index, si)
+
+    # Pseudo random generation, i is the same for every key.
+    KS = np.empty((count, n), dtype=np.uint8)
+    j[:] = 0
+    for step in range(drop + n):
+        i = (step + 1) & 0xFF
+        si = S[:, i].copy()
+        j += si
+        j &= 0xFF
+        index = base + j
+        sj = flat.take(index)
+        S[:, i] = sj
+        flat.put(index, si)
+        if step >= drop:
+            KS[:, step - drop] = flat.take(base + ((si + sj) & 0xFF))
+    return KS
 
 
 def RC4(k, m):
@@ -23,49 +174,87 @@ def RC4(k, m):
     :return: a string representing the ciphertext produced by the encryption process.
     """
 
-    # Encode key as an ASCII valued array.
-    K = np.array([ord(c) for c in k])
-    # The length of the key array
-    keylen = K.shape[0]
+    # Encode message as an array of code points, XOR it with the key stream and decode it back.
+    M = np.frombuffer(m.encode("utf-32-le"), dtype="<u4")
+    KS = np.frombuffer(RC4Stream(k).keystream(M.shape[0]), dtype=np.uint8)
+    return np.bitwise_xor(M, KS).astype("<u4").tobytes().decode("utf-32-le")
 
-    # Encode message as an ASCII valued array.
-    M = np.array([ord(c) for c in m])
-    # The length of the message array
-    messagelen = M.shape[0]
 
-    # The array used to store the permutations
-    S = np.empty(256, dtype=int)
-    # The array used to store the key repeated as many times as needed.
-    T = np.empty(256, dtype=int)
+def encrypt_file(k, source, destination, offset=0, drop=0, window=WINDOW_SIZE):
+    """
+    Encrypts (or decrypts) a file of any size with constant memory.
 
-    # Create the key stream array
-    KS = np.empty(messagelen, dtype=int)
+    Both files are memory-mapped one window at a time and every window is encrypted in place in the output, with a
+    single keystream running over the whole file.
 
-    # Initialization
-    for i in range(256):
-        S[i] = i
-        T[i] = K[i % keylen]
+    :param k: a string or a bytes-like object representing the key.
+    :param source: a string representing the path of the input file.
+    :param destination: a string representing the path of the output file, replaced if it exists.
+    :param offset: an integer representing the position of the file in the keystream, so that a file holding a part
+    of a longer stream can be processed on its own.
+    :param drop: an integer representing the number of keystream bytes discarded before the stream starts, as in
+    RC4-drop[n].
+    :param window: an integer representing the number of bytes mapped at once, rounded up to a multiple of the
+    mmap allocation granularity.
+    :return: an integer representing the number of bytes processed.
+    """
+
+    granularity = mmap.ALLOCATIONGRANULARITY
+    window = max(granularity, -(-window // granularity) * granularity)
+    stream = RC4Stream(k)
+    stream.skip(drop + offset)
+
+    size = os.path.getsize(source)
+    with open(source, "rb") as fin, open(destination, "w+b") as fout:
+        fout.truncate(size)
+        for start in range(0, size, window):
+            length = min(window, size - start)
+            with mmap.mmap(fin.fileno(), length, offset=start, access=mmap.ACCESS_READ) as src, \
+                    mmap.mmap(fout.fileno(), length, offset=start, access=mmap.ACCESS_WRITE) as dst:
+                dst[:] = src
+                with memoryview(dst) as view:
+                    stream.update_into(view)
+    return size
+
+
+def benchmark(size=1 << 22):
+    """
+    Measures the throughput of the stream engine.
+
+    :param size: an integer representing the number of bytes to be encrypted.
+    :return: a float representing the throughput, in MB per second.
+    """
+
+    buffer = bytearray(size)
+    stream = RC4Stream(b"benchmark key")
+    start = time.perf_counter()
+    stream.update_into(buffer)
+    rate = size / (time.perf_counter() - start) / 1e6
+    print("RC4 stream: {:.2f} MB/s".format(rate))
+    return rate
 
-    # Initial Permutations of S
-    j = 0
-    for i in range(256):
-        j = (j + S[i] + T[i]) % 256
-        swap(S[i], S[j])
 
-    # Generate Key Stream
-    i = 0
-    j = 0
-    while i < messagelen:
-        i = (i + 1) % 256
-        j = (j + S[i]) % 256
-        swap(S[i], S[j])
-        t = (S[i] + S[j]) % 256
-        KS[i - 1] = S[t]
+def benchmark_keystreams(count=10000, length=16, n=64):
+    """
+    Compares the batched keystream generation against one stream per key.
 
-    # Decode ASCII valued array as a message referred to as the cypher
-    c = ''.join(np.array([chr(num) for num in np.bitwise_xor(M, KS)]))
+    :param count: an integer representing the number of keys.
+    :param length: an integer representing the length of every key, in bytes.
+    :param n: an integer representing the length of every keystream.
+    :return: a dictionary holding the time per key of both methods, in microseconds.
+    """
 
-    return c
+    keys = [os.urandom(length) for _ in range(count)]
+    start = time.perf_counter()
+    single = [RC4Stream(k).keystream(n) for k in keys]
+    one_by_one = (time.perf_counter() - start) / count * 1e6
+    start = time.perf_counter()
+    batch = keystreams(keys, n)
+    batched = (time.perf_counter() - start) / count * 1e6
+    assert all(bytes(row) == ks for row, ks in zip(batch, single))
+    print("{} keys: {:.2f} us per key one by one, {:.2f} us per key batched ({:.1f}x)".format(
+        count, one_by_one, batched, one_by_one / batched))
+    return {"one_by_one": one_by_one, "batched": batched}
 
 
 if __name__ == "__main__":
@@ -78,3 +267,16 @@ if __name__ == "__main__":
     print("The cypher given after RC4 encryption: {}".format(ciphertext))
     print("The message given after RC4 decryption: {}".format(RC4(key, ciphertext)))
 
+    benchmark()
+    benchmark_keystreams()
+
+    with tempfile.TemporaryDirectory() as directory:
+        plain, encrypted, decrypted = (os.path.join(directory, name) for name in ("plain", "encrypted", "decrypted"))
+        with open(plain, "wb") as f:
+            f.write(os.urandom(1 << 20))
+        start = time.perf_counter()
+        encrypt_file(key, plain, encrypted, drop=3072)
+        print("Encrypted a 1 MiB file in {:.3f} s.".format(time.perf_counter() - start))
+        encrypt_file(key, encrypted, decrypted, drop=3072)
+        with open(plain, "rb") as f, open(decrypted, "rb") as g:
+            print("File decryption successful: {}".format(f.read() == g.read()))
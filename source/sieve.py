@@ -0,0 +1,144 @@
+import collections
+import functools
+import math
+import random
+
+# Default bound for the small primes used to discard candidates before any probabilistic test.
+SIEVE_BOUND = 10000
+
+# Number of candidates rejected (or accepted) by each stage of the primality tests.
+STATS = collections.Counter()
+
+
+@functools.lru_cache(maxsize=8)
+def small_primes(bound=SIEVE_BOUND):
+    """
+    Implements the sieve of Eratosthenes in order to list every prime below a bound.
+
+    :param bound: an integer representing the (exclusive) upper bound of the primes to be listed.
+    :return: a tuple containing every prime smaller than bound, in increasing order.
+    """
+
+    if bound < 3:
+        return ()
+    is_candidate = bytearray([1]) * bound
+    is_candidate[0] = is_candidate[1] = 0
+    for i in range(2, math.isqrt(bound - 1) + 1):
+        if is_candidate[i]:
+            # Cross out every multiple of i starting from i^2.
+            is_candidate[i * i::i] = bytes(len(range(i * i, bound, i)))
+    return tuple(i for i in range(bound) if is_candidate[i])
+
+
+@functools.lru_cache(maxsize=8)
+def primorial(bound=SIEVE_BOUND):
+    """
+    Utility function that calculates the product of every prime below a bound.
+
+    :param bound: an integer representing the (exclusive) upper bound of the primes to be multiplied.
+    :return: an integer equal to the product of every prime smaller than bound.
+    """
+
+    return math.prod(small_primes(bound))
+
+
+def trial_division(n, bound=SIEVE_BOUND):
+    """
+    Utility function that checks whether a number has a prime factor smaller than the given bound.
+
+    Instead of dividing by every small prime in turn, a single gcd with their product is computed.
+
+    :param n: an integer greater than 1 that is going to be checked.
+    :param bound: an integer representing the (exclusive) upper bound of the primes to divide by.
+    :return: False if n is divisible by a small prime other than itself, True otherwise.
+    """
+
+    if n < bound:
+        return n in small_primes(bound)
+    return math.gcd(n, primorial(bound)) == 1
+
+
+def interval_search(length, is_prime, diff=0, bound=SIEVE_BOUND, width=None, rand=None, intervals=None):
+    """
+    Searches for a random prime of the desired length by sieving whole intervals of odd candidates.
+
+    A random odd start is drawn once and the interval start, start + 2, ..., start + 2 * (width - 1) is sieved
+    against every small prime at once, so that only the survivors reach the probabilistic test. When an interval
+    holds no prime the next one is sieved by stepping the residues of the small primes forward, without any big
+    integer division. A new start is drawn only when the search would leave the desired length.
+
+    :param length: an integer representing the desired length (bitwise) of the prime.
+    :param is_prime: a function that tests a survivor of the sieve for primality.
+    :param diff: a prime number that should not be returned by the function.
+    :param bound: an integer representing the (exclusive) upper bound of the small primes used for sieving.
+    :param width: an integer representing the number of odd candidates sieved at once, by default 2 * length.
+    :param rand: a function that returns a random integer of the given length, by default random.getrandbits.
+    :param intervals: an integer bounding the number of intervals sieved before giving up, unbounded by default.
+    :return: a random prime number of the desired length, or None if every allowed interval was exhausted.
+    """
+
+    if length < 2:
+        raise ValueError("There are no primes shorter than 2 bits.")
+    if width is None:
+        width = max(64, 2 * length)
+    primes = small_primes(bound)[1:]
+    low, high = 1 << (length - 1), 1 << length
+
+    start = None
+    while intervals is None or intervals > 0:
+        if intervals is not None:
+            intervals -= 1
+        if start is None or start + 2 * width > high:
+            # Draw a fresh odd start of exactly length bits and compute the residues once.
+            if rand is None:
+                start = random.getrandbits(length - 1) | low | 1
+            else:
+                start = rand(length) | 1
+            residues = [start % p for p in primes]
+        span = min(width, (high - start + 1) // 2)
+
+        # survivors[i] = 1 if start + 2i has no small prime factor
+        survivors = bytearray([1]) * span
+        for p, r in zip(primes, residues):
+            # Solve start + 2i = 0 mod p for the first index i.
+            i = (p - r) * ((p + 1) // 2) % p
+            if start + 2 * i == p:
+                i += p
+            if i < span:
+                survivors[i::p] = bytes(len(range(i, span, p)))
+
+        i = survivors.find(1)
+        while i != -1:
+            candidate = start + 2 * i
+            if candidate != diff and is_prime(candidate):
+                STATS["sieve"] += survivors.count(0, 0, i)
+                return candidate
+            i = survivors.find(1, i + 1)
+        STATS["sieve"] += survivors.count(0)
+
+        # Step every residue forward to the next interval.
+        start += 2 * span
+        residues = [(r + 2 * span) % p for p, r in zip(primes, residues)]
+    return None
+
+
+def reset_stats():
+    """
+    Utility function that clears the counters of every stage.
+    """
+
+    STATS.clear()
+
+
+def report_stats():
+    """
+    Utility function that formats the counters of every stage.
+
+    :return: a string listing how many candidates were rejected by each stage and how many were accepted.
+    """
+
+    total = sum(STATS.values())
+    lines = ["{} candidates tested".format(total)]
+    for stage, count in STATS.most_common():
+        lines.append("{:>16}: {} ({:.1%})".format(stage, count, count / total if total else 0))
+    return "\n".join(lines)
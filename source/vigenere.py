@@ -1,49 +1,116 @@
+import sys
+
 import numpy as np
 
 # Constants
 NUM_OF_ENG_CHARS = 26
-ENG_LETTER_FREQ_ORDER = ['E', 'T', 'A', 'O', 'I', 'N', 'S', 'H', 'R', 'D', 'L', 'C', 'U',
-                         'M', 'W', 'F', 'G', 'Y', 'P', 'B', 'V', 'K', 'J', 'X', 'Q', 'Z']
+# Relative frequency of every letter, from A to Z, in English texts.
+ENG_LETTER_FREQ = np.array([0.08167, 0.01492, 0.02782, 0.04253, 0.12702, 0.02228, 0.02015, 0.06094, 0.06966,
+                            0.00153, 0.00772, 0.04025, 0.02406, 0.06749, 0.07507, 0.01929, 0.00095, 0.05987,
+                            0.06327, 0.09056, 0.02758, 0.00978, 0.02360, 0.00150, 0.01974, 0.00074])
+ENG_LETTER_FREQ /= ENG_LETTER_FREQ.sum()
+# Circulant matrix of the chi-squared test, CHI_SQUARED[c, s] = 1 / P(letter c - s).
+CHI_SQUARED = 1 / ENG_LETTER_FREQ[np.subtract.outer(np.arange(NUM_OF_ENG_CHARS), np.arange(NUM_OF_ENG_CHARS))
+                                  % NUM_OF_ENG_CHARS]
+# Index of Coincidence of uniformly random letters.
+RANDOM_IC = 1 / NUM_OF_ENG_CHARS
+# Longest key length tried by the Friedman test.
+MAX_KEY_LENGTH = 40
+# Number of characters read at once from a stream.
+CHUNK_SIZE = 1 << 20
+
+
+def to_codes(text):
+    """
+    Utility function that converts a text to the indices of its letters in the English alphabet.
+
+    :param text: a string, letters are taken regardless of case and every other character is dropped.
+    :return: a NumPy uint8 array holding a value between 0 and 25 for every letter of the text.
+    """
+
+    data = np.frombuffer(text.upper().encode("ascii", errors="ignore"), dtype=np.uint8)
+    return data[(data >= ord('A')) & (data <= ord('Z'))] - ord('A')
+
+
+def column_counts(codes, k):
+    """
+    Utility function that counts the letters of every column when the text is written in rows of k letters.
 
+    :param codes: a NumPy uint8 array as returned by to_codes.
+    :param k: an integer representing the number of columns.
+    :return: a NumPy array of shape (k, 26), where [i, x] counts the letter x in the i-th column.
+    """
+
+    # Letter x of column i is counted in the bin 26 * i + x.
+    offsets = NUM_OF_ENG_CHARS * np.arange(k)
+    rows = len(codes) // k
+    counts = np.bincount((codes[:rows * k].reshape(rows, k) + offsets).ravel(), minlength=NUM_OF_ENG_CHARS * k)
+    # The ragged last row only fills the first columns.
+    tail = codes[rows * k:]
+    counts += np.bincount(tail + offsets[:len(tail)], minlength=NUM_OF_ENG_CHARS * k)
+    return counts.reshape(k, NUM_OF_ENG_CHARS)
+
+
+def counts_IC(counts):
+    """
+    Utility function that calculates the Index of Coincidence of every row of a letter count matrix.
 
-def find_key_length(ciphertext):
+    :param counts: a NumPy array of shape (..., 26) of letter counts.
+    :return: a NumPy array of the Index of Coincidence of every row, NaN for rows of less than 2 letters.
+    """
+
+    counts = counts.astype(np.float64)
+    length = counts.sum(axis=-1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return (counts * (counts - 1)).sum(axis=-1) / (length * (length - 1))
+
+
+def rank_key_lengths(ciphertext, max_length=MAX_KEY_LENGTH):
+    """
+    Implements the Friedman test for every candidate key length at once.
+
+    The ciphertext is converted once, and for every period k up to max_length the Index of Coincidence of each
+    of its k columns is computed from a single bincount. The score of a period is the mean IC of its columns,
+    which is close to English (0.067) for the key length and its multiples and close to random (0.038) otherwise.
+
+    :param ciphertext: a string representing the given ciphertext.
+    :param max_length: an integer bounding the key lengths tried, so that every column holds at least 2 letters.
+    :return: a list of (key length, score) pairs, from the highest score to the lowest.
+    """
+
+    codes = to_codes(ciphertext)
+    periods = range(1, min(max_length, len(codes) // 2) + 1)
+    scores = [(k, float(np.mean(counts_IC(column_counts(codes, k))))) for k in periods]
+    return sorted(scores, key=lambda pair: (-pair[1], pair[0]))
+
+
+def find_key_length(ciphertext, max_length=MAX_KEY_LENGTH, tolerance=0.8):
     """
     Implements the Friedman test in order to determine the key length that was used during encryption.
 
     :param ciphertext: a string representing the given ciphertext.
+    :param max_length: an integer bounding the key lengths tried.
+    :param tolerance: a float, the shortest key length whose score rises above the random IC by at least this
+    fraction of the best score is taken, as the multiples of the key length score as high as the key length itself.
     :return: an integer representing the length of the key used to produce the given ciphertext.
     """
 
-    # k <- 2
-    k = 2
-    # found = false
-    # While found = false do
-    while True:
-        # Create an [n/k] x k matrix
-        num_of_rows = len(ciphertext) / k
-        if num_of_rows.is_integer():
-            num_of_cols = k
-            cols = int(num_of_cols) * [""]
-            # which columns are the vectors
-            # Col[1] = (c[1], c[1+k], ...)
-            # Col[2] = (c[2], c[2+k], ...)
-            # ............................
-            # Col[k] = (c[k], c[2*k], ...)
-            for i in range(int(num_of_cols)):
-                col_string = ""
-                for j in range(int(num_of_rows)):
-                    col_string += ciphertext[i + (j * int(num_of_cols))]
-                cols[i] = col_string
-
-            # For i = 1 to k do
-            for i in range(k):
-                # if IC(Col[i]) is close to 0.067 then
-                if 0.065 < IC(cols[i]) < 0.070:
-                    # found = true
-                    # return k
-                    return k
-        # k <- k + 1
-        k += 1
+    return pick_key_length(rank_key_lengths(ciphertext, max_length), tolerance)
+
+
+def pick_key_length(ranking, tolerance=0.8):
+    """
+    Utility function that picks the key length out of a ranking, see find_key_length.
+
+    :param ranking: a list of (key length, score) pairs, from the highest score to the lowest.
+    :param tolerance: a float, see find_key_length.
+    :return: an integer representing the key length.
+    """
+
+    if not ranking:
+        raise ValueError("The ciphertext is too short to find the key length.")
+    threshold = RANDOM_IC + tolerance * (ranking[0][1] - RANDOM_IC)
+    return min(k for k, score in ranking if score >= threshold)
 
 
 def IC(string):
@@ -53,35 +120,70 @@ def IC(string):
     :param string: the string of which the Index of Coincidence is going to be calculated.
     :return: a float representing the Index of Coincidence for the given string.
     """
-    length = len(string)
-    # Counts string's letter frequency.
-    letter_freq = letter_freq_analysis(string)
-    summation = 0
-    for i in range(NUM_OF_ENG_CHARS):
-        summation += letter_freq[i] * (letter_freq[i] - 1)
+
     # Return (m_a / k) * ((m_a - 1) / (k - 1))
-    return summation / (length * (length - 1))
+    return float(counts_IC(np.bincount(to_codes(string), minlength=NUM_OF_ENG_CHARS)))
+
+
+def shift_scores(counts):
+    """
+    Implements the chi-squared test of every column against English for all 26 shifts at once.
+
+    For a column of n letters with counts m_c, the statistic of the shift s is
+    sum_c (m_c - n * P(c - s))^2 / (n * P(c - s)) = sum_c m_c^2 / (n * P(c - s)) - n,
+    so the statistics of every shift of every column are a single product with a circulant matrix.
+
+    :param counts: a NumPy array of shape (k, 26) as returned by column_counts.
+    :return: a NumPy array of shape (k, 26), where [i, s] is the statistic of the i-th column decrypted with the
+    shift s, the lower the closer to English.
+    """
+
+    counts = counts.astype(np.float64)
+    length = counts.sum(axis=1, keepdims=True)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return (counts ** 2) @ CHI_SQUARED / length - length
+
+
+def recover_key(ciphertext, key_length):
+    """
+    Function used to determine the key used during encryption by finding, for every letter of the key, the shift
+    that makes its column closest to English.
+
+    :param ciphertext: a string representing the ciphertext to be decrypted.
+    :param key_length: an integer representing the length of the key used for encryption.
+    :return: a (key, confidence) pair, where confidence holds a float between 0 and 1 for every letter of the key:
+    1 - (best statistic / second best statistic), close to 0 when two shifts fit about as well.
+    """
+
+    return key_from_counts(column_counts(to_codes(ciphertext), key_length))
+
+
+def key_from_counts(counts):
+    """
+    Utility function that recovers a key from the letter counts of its columns, see recover_key.
+
+    :param counts: a NumPy array of shape (key length, 26) as returned by column_counts.
+    :return: a (key, confidence) pair, see recover_key.
+    """
+
+    scores = shift_scores(counts)
+    if np.isnan(scores).any():
+        raise ValueError("The ciphertext is too short for a key of length {}.".format(len(counts)))
+    best, second = np.sort(scores, axis=1)[:, :2].T
+    key = (np.argmin(scores, axis=1) + ord('A')).astype(np.uint8).tobytes().decode("ascii")
+    return key, (1 - best / second).tolist()
 
 
 def find_key(ciphertext, key_length):
     """
-    Function used to determine the key used during encryption by matching the most frequent letter in
-    the ciphertext with the most frequent letter in the English alphabet.
+    Function used to determine the key used during encryption with the chi-squared test, see recover_key.
 
     :param ciphertext: a string representing the ciphertext to be decrypted.
     :param key_length: an integer representing the length of the key used for encryption.
     :return: a string representing the key used for encryption.
     """
 
-    k = ""
-    string = key_length * [""]
-    for i in range(key_length):
-        for j in range(len(ciphertext) // key_length):
-            string[i] += ciphertext[i + j * key_length]
-        max_char_ascii = ord('A') + np.argmax(letter_freq_analysis(string[i]))
-        key_char = chr(ord('A') + ((max_char_ascii - (ord(ENG_LETTER_FREQ_ORDER[0]))) % 26))
-        k += key_char
-    return k
+    return recover_key(ciphertext, key_length)[0]
 
 
 def letter_freq_analysis(string):
@@ -93,36 +195,120 @@ def letter_freq_analysis(string):
     """
 
     # Frequency of each letter in the string
-    letter_freq = NUM_OF_ENG_CHARS * [0]
-    for i in range(len(string)):
-        letter_freq[ord(string[i]) - ord('A')] += 1
-    return letter_freq
+    return np.bincount(to_codes(string), minlength=NUM_OF_ENG_CHARS).tolist()
 
 
 def decipher(ciphertext, key):
     """
     Utility function used to produce the original message.
 
-    :param ciphertext: a string representing the ciphertext produced by the Vigenere cipher.
+    :param ciphertext: a string representing the ciphertext produced by the Vigenere cipher, every character that is
+    not a letter is dropped as in to_codes.
     :param key: a string representing the key that was used to encrypt the original message.
     :return: a string representing the original message that was produced by decrypting the ciphertext.
     """
 
-    key_stream = ""
+    codes, shifts = to_codes(ciphertext).astype(np.intp), to_codes(key).astype(np.intp)
+    if not len(shifts):
+        raise ValueError("The key must contain at least one letter.")
+
+    # Decipher the ciphertext letter by letter, the key is repeated as many times as needed and its last copy may
+    # be cut short.
+    message = (codes - shifts[np.arange(len(codes)) % len(shifts)]) % 26 + ord('A')
+    return message.astype(np.uint8).tobytes().decode("ascii")
+
+
+class StreamAnalyzer:
+    """
+    Online cryptanalysis of a Vigenere ciphertext that arrives in chunks.
+
+    Only the letter counts of every column of every period up to max_period are kept, so the memory in use is
+    O(max_period^2 * 26) whatever the length of the stream, and the current best key length and key can be asked
+    for at any time.
+    """
+
+    def __init__(self, max_period=MAX_KEY_LENGTH):
+        """
+        :param max_period: an integer representing the longest key length tried.
+        """
+
+        self.max_period = max_period
+        # counts[k - 1][i] counts the letters at the positions i, i + k, i + 2k, ...
+        self.counts = [np.zeros((k, NUM_OF_ENG_CHARS), dtype=np.int64) for k in range(1, max_period + 1)]
+        self.length = 0
+
+    def update(self, chunk):
+        """
+        Adds the next part of the ciphertext.
+
+        :param chunk: a string, letters are taken regardless of case and every other character is dropped.
+        """
+
+        codes = to_codes(chunk)
+        for k, counts in enumerate(self.counts, 1):
+            # The chunk starts in the column length mod k, not in the first one.
+            counts += np.roll(column_counts(codes, k), self.length % k, axis=0)
+        self.length += len(codes)
+
+    def ranking(self):
+        """
+        :return: a list of (key length, score) pairs for the periods seen so far, see rank_key_lengths.
+        """
+
+        periods = range(1, min(self.max_period, self.length // 2) + 1)
+        scores = [(k, float(np.mean(counts_IC(self.counts[k - 1])))) for k in periods]
+        return sorted(scores, key=lambda pair: (-pair[1], pair[0]))
 
-    # Produce key stream.
-    for i in range(len(ciphertext) // len(key)):
-        key_stream += key
-    message = ""
+    def key_length(self, tolerance=0.8):
+        """
+        :param tolerance: a float, see find_key_length.
+        :return: an integer representing the current estimate of the key length.
+        """
 
-    # Decipher the ciphertext letter by letter.
-    for i in range(len(ciphertext)):
-        message += chr(ord('A') + ((ord(ciphertext[i]) - ord(key_stream[i])) % 26))
+        return pick_key_length(self.ranking(), tolerance)
 
-    return message
+    def key(self, key_length=None):
+        """
+        :param key_length: an integer representing the key length, the current estimate by default.
+        :return: a (key, confidence) pair, see recover_key.
+        """
+
+        if key_length is None:
+            key_length = self.key_length()
+        if not 1 <= key_length <= self.max_period:
+            raise ValueError("Key lengths above {} are not tracked.".format(self.max_period))
+        return key_from_counts(self.counts[key_length - 1])
+
+
+def analyze_stream(source, max_period=MAX_KEY_LENGTH, progress=sys.stderr):
+    """
+    Runs the online cryptanalysis over a text file object, such as a pipe.
+
+    :param source: a text file object holding the ciphertext.
+    :param max_period: an integer representing the longest key length tried.
+    :param progress: a text file object to which the current estimate is reported after every chunk, None to
+    stay silent.
+    :return: the StreamAnalyzer holding the counts of the whole stream.
+    """
+
+    analyzer = StreamAnalyzer(max_period)
+    for chunk in iter(lambda: source.read(CHUNK_SIZE), ""):
+        analyzer.update(chunk)
+        if progress is not None and analyzer.length >= 2:
+            key, _ = analyzer.key()
+            progress.write("{} letters, key length {}, key {}\n".format(analyzer.length, len(key), key))
+    return analyzer
 
 
 if __name__ == '__main__':
+    if len(sys.argv) == 2:
+        # python vigenere.py ciphertext.txt, or python vigenere.py - to read from a pipe
+        with (open(sys.argv[1]) if sys.argv[1] != "-" else sys.stdin) as f:
+            key, confidence = analyze_stream(f).key()
+        print("The key used for encrypting was found to be the word {}".format(key))
+        print("Confidence of every letter of the key: {}".format(", ".join("{:.2f}".format(c) for c in confidence)))
+        sys.exit()
+
     ciphertext = "MYHSIFPFGIMUCEXIPRKHFFQPRVAGIDDVKVRXECSKAPFGHMESJWUSSEHNEZIXFFLPQDVTCEUGTEEMFRQXWYCLPPAMBSKSTTPGSMIDNSES" \
              "ZJBDWJWSPQYINUVRFXPVPCEOZQRBNLUIINSRPXLEEHKSTTPGCEIMCSKVVVTJQRBSIUCKJOIIXXOVHYEFLINOEXFDPZJVFKTETVFXTTVJ" \
              "VRTBXRVGJRAIFPSRGTDXYSIWYXWVFPAQSSEHNEZIXFVRXQPRURVWBXWVCEIMCSKVVVUCXYWJAAGPUHYIDTMJFFSYUSISMIDNSESRRPIL" \
@@ -150,11 +336,22 @@ if __name__ == '__main__':
              "VOJSZPAFFCHIWIISJGUTRTSRRPEVFUIIEHAZZCPQPHKCRPXBIEGYEBEMESJWEDPUWVVEXRKVVRMBIFTUIYDGIOTCXTXLGRPXJRZHV"
     print("The ciphertext is as following: {}".format(ciphertext))
 
+    print("The most likely key lengths are: {}".format(
+        ", ".join("{} ({:.4f})".format(k, score) for k, score in rank_key_lengths(ciphertext)[:5])))
     key_length = find_key_length(ciphertext)
     print("The length of the key was found to be equal to {}".format(key_length))
 
-    key = find_key(ciphertext, key_length)
+    key, confidence = recover_key(ciphertext, key_length)
     print("The key used for encrypting was found to be the word {}".format(key))
+    print("Confidence of every letter of the key: {}".format(", ".join("{:.2f}".format(c) for c in confidence)))
 
     message = decipher(ciphertext, key)
     print("The original message is found to be: {}".format(message))
+
+    # The same analysis, fed one line of 80 characters at a time.
+    analyzer = StreamAnalyzer()
+    for i in range(0, len(ciphertext), 80):
+        analyzer.update(ciphertext[i:i + 80])
+        if i % 800 == 0 and analyzer.length >= 2:
+            print("After {} letters the key is estimated to be {}".format(analyzer.length, analyzer.key()[0]))
+    print("After the whole stream the key is estimated to be {}".format(analyzer.key()[0]))
@@ -1,68 +1,84 @@
-def fast(a, g, N):
-    """
-    Implements a fast algorithm that calculates the modular exponentiation
-    of the parameters gives such as: Result = a^g mod N.
+import collections
+import csv
+import json
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
 
-    :param a: an integer representing the base factor of the calculation.
-    :param g: an integer representing the exponent factor of the calculation.
-    :param N: an integer representing the modulus factor of the calculation.
-    :return: an integer representing the modular exponentiation result equal to a^g mod N.
-    """
-    # g = (g_n g_n-1 ... g_0)_2
-    g = bin(g).replace("0b", "")[::-1]
-    # x <- a, d <- 1
-    x, d = a, 1
-    # for i=0 to n do
-    for i in range(len(g)):
-        # if g_1 = 1 then
-        if g[i] == '1':
-            # d <- d*x mod N
-            d = (d * x) % N
-        # x <- x^2 mod N
-        x = (x * x) % N
-    # return d
-    return d
+from mod_exp import FixedExponent
+from primality import bpsw
+from sieve import interval_search
 
 
-def get_pq(x, y):
+def convergents(x, y):
     """
-    Utility function used to produce the partial quotients for a continuous fraction.
+    Utility function that lazily produces the convergents of a continued fraction, one partial quotient at a time.
 
     :param x: an integer representing the numerator of the fraction.
     :param y: an integer representing the denominator of the fraction.
-    :return: a list filled with the produced partial quotients.
+    :return: a generator of (numerator, denominator) pairs for the successive convergents of x / y.
+    """
+
+    # h_i = a_i * h_{i-1} + h_{i-2}, k_i = a_i * k_{i-1} + k_{i-2}, starting from h_{-1} / k_{-1} = 1 / 0.
+    h, h_prev = 1, 0
+    k, k_prev = 0, 1
+    while y:
+        quotient, remainder = divmod(x, y)
+        h, h_prev = quotient * h + h_prev, h
+        k, k_prev = quotient * k + k_prev, k
+        yield h, k
+        x, y = y, remainder
+
+
+def check_candidate(N, e, k, d):
+    """
+    Utility function that checks whether a convergent k / d of e / N reveals the factorization of N.
+
+    If e * d = 1 + k * φ(N) then φ(N) gives p + q = N - φ(N) + 1, and p, q are the roots of
+    x^2 - (p + q) * x + N = 0, which must then have an integer discriminant square root.
+
+    :param N: an integer representing the RSA modulus.
+    :param e: an integer representing the encryption exponent.
+    :param k: an integer representing the numerator of the convergent.
+    :param d: an integer representing the denominator of the convergent, the candidate secret key.
+    :return: a (p, q) pair if the candidate is the secret key, None otherwise.
     """
 
-    list = []
-    quotient = x // y
-    remainder = x % y
-    list.append(quotient)
-    while remainder > 0:
-        x = y
-        y = remainder
-        quotient = x // y
-        remainder = x % y
-        list.append(quotient)
-    return list
+    if k == 0 or (e * d - 1) % k:
+        return None
+    phi = (e * d - 1) // k
+    s = N - phi + 1
+    discriminant = s * s - 4 * N
+    if discriminant < 0:
+        return None
+    r = math.isqrt(discriminant)
+    if r * r != discriminant or (s + r) % 2:
+        return None
+    return (s + r) // 2, (s - r) // 2
 
 
-def get_denominators(pq):
+def wiener_attack(N, e):
     """
-    Utility function used to extract the denominators of the partial quotients given as parameter.
+    Implements the Weiner attack, recovering both the secret key and the factorization of N.
 
-    :param pq: a list filled with the partial quotient which the denominators are to be extracted.
-    :return: a list filled with the denominators found for the partial quotient given as parameter.
+    The convergents of e / N are generated lazily and the attack stops at the first one that passes the quadratic
+    check, so it costs little more than the continued fraction expansion itself.
+
+    :param N: an integer representing the RSA modulus.
+    :param e: an integer representing the encryption exponent.
+    :return: None if the attack fails, a (d, p, q) tuple if the attack succeeds.
     """
 
-    # The denominator of the first partial quotient is equal to 1.
-    # The denominator of the second partial quotient is equal to itself.
-    d = [1, pq[1]]
-    for i in range(2, len(pq)):
-        # The denominator of the i-th partial quotient is equal to the i-th partial quotient times the last
-        # denominator plus the penultimate denominator.
-        d_i = pq[i] * d[i - 1] + d[i - 2]
-        d.append(d_i)
-    return d
+    for k, d in convergents(e, N):
+        factors = check_candidate(N, e, k, d)
+        if factors is not None:
+            return (d,) + factors
+    # Return None if the attack fails
+    return None
 
 
 def weiner(N, e):
@@ -74,19 +90,169 @@ def weiner(N, e):
     :return: None if the attack fails, the secret key if the attack succeeds.
     """
 
-    # Find the partial quotients of e / N.
-    partial_quotients = get_pq(e, N)
-    # Find the denominators of the found partial quotients.
-    c = get_denominators(partial_quotients)
-    # Find D such that (2^e)^D = 2modN, and return it.
-    for i in range(1, len(c)):
-        if fast(2, (e*c[i]), N) == 2:
-            return c[i]
-    # Return None if the attack fails
-    return None
+    result = wiener_attack(N, e)
+    return None if result is None else result[0]
+
+
+def parse_int(value):
+    """
+    Utility function that parses an integer written in decimal or with a 0x prefix.
+
+    :param value: an integer or a string.
+    :return: an integer.
+    """
+
+    return value if isinstance(value, int) else int(value.strip(), 0)
+
+
+def read_keys(source, skip=0):
+    """
+    Utility function that reads public keys from a JSON-lines or a CSV file.
+
+    A JSON-lines file holds one object per line with the keys "N" and "e", a CSV file has a header row naming
+    the columns "N" and "e". An optional "id" field names the key, its position in the file is used otherwise.
+
+    :param source: a text file object.
+    :param skip: an integer representing the number of records to skip, when resuming an audit.
+    :return: a generator of (id, N, e) tuples.
+    """
+
+    first = source.readline()
+    if first.lstrip().startswith("{"):
+        lines = (line for part in ([first], source) for line in part if line.strip())
+        records = (json.loads(line) for line in lines)
+    else:
+        records = csv.DictReader(source, fieldnames=next(csv.reader([first])))
+    for index, record in enumerate(records):
+        if index >= skip:
+            yield record.get("id", index), parse_int(record["N"]), parse_int(record["e"])
+
+
+def audit_chunk(records):
+    """
+    A unit of work for the process pool: runs the Wiener attack on a chunk of public keys.
+
+    :param records: a list of (id, N, e) tuples.
+    :return: a list of dictionaries describing the vulnerable keys of the chunk.
+    """
+
+    vulnerable = []
+    for key_id, N, e in records:
+        result = wiener_attack(N, e)
+        if result is not None:
+            d, p, q = result
+            vulnerable.append({"id": key_id, "N": str(N), "e": str(e), "d": str(d), "p": str(p), "q": str(q)})
+    return vulnerable
+
+
+def audit(source, destination, processes=None, chunk_size=64, max_pending=None, resume=True, progress=sys.stderr):
+    """
+    Function implementing a parallel Wiener audit over a corpus of public keys.
+
+    Chunks of keys are handed to a process pool as they are read, with at most max_pending chunks in flight. The
+    vulnerable keys are appended to the destination as JSON lines, in the order of the corpus, and the number of
+    keys audited so far is saved next to it after every chunk, so that an interrupted audit resumes where it
+    stopped.
+
+    :param source: a string representing the path of the JSON-lines or CSV corpus.
+    :param destination: a string representing the path of the JSON-lines report of vulnerable keys.
+    :param processes: an integer representing the size of the pool, by default the number of cores.
+    :param chunk_size: an integer representing the number of keys per task.
+    :param max_pending: an integer bounding the number of chunks in flight, by default twice the pool size.
+    :param resume: True to continue a previous audit of the same corpus, False to start over.
+    :param progress: a text file object to which the progress is reported, None to stay silent.
+    :return: a (audited, vulnerable) pair counting the keys of this run.
+    """
+
+    checkpoint = destination + ".progress"
+    done = 0
+    if resume and os.path.exists(checkpoint):
+        with open(checkpoint) as f:
+            done = int(f.read() or 0)
+    elif os.path.exists(checkpoint):
+        os.remove(checkpoint)
+
+    processes = processes or os.cpu_count() or 1
+    max_pending = max_pending or 2 * processes
+    pending = collections.deque()
+    audited = vulnerable = 0
+    start = time.perf_counter()
+
+    def collect(output):
+        nonlocal audited, vulnerable
+        size, future = pending.popleft()
+        for record in future.result():
+            output.write(json.dumps(record) + "\n")
+            vulnerable += 1
+        output.flush()
+        audited += size
+        # Replace the checkpoint atomically, so that it never counts keys whose report was not written.
+        with open(checkpoint + ".tmp", "w") as f:
+            f.write(str(done + audited))
+        os.replace(checkpoint + ".tmp", checkpoint)
+        if progress is not None:
+            rate = audited / (time.perf_counter() - start)
+            progress.write("{} keys audited, {} vulnerable, {:.1f} keys per second\n".format(
+                done + audited, vulnerable, rate))
+
+    with open(source, newline="") as f, open(destination, "a" if done else "w") as output, \
+            ProcessPoolExecutor(processes) as executor:
+        chunk = []
+        for record in read_keys(f, done):
+            chunk.append(record)
+            if len(chunk) == chunk_size:
+                if len(pending) == max_pending:
+                    collect(output)
+                pending.append((len(chunk), executor.submit(audit_chunk, chunk)))
+                chunk = []
+        if chunk:
+            pending.append((len(chunk), executor.submit(audit_chunk, chunk)))
+        while pending:
+            collect(output)
+    return audited, vulnerable
+
+
+def benchmark_audit(size=1000, length=256, ratio=0.1, processes=None):
+    """
+    Measures the audit throughput on a generated corpus in which a fraction of the keys use a small secret key.
+
+    :param size: an integer representing the number of keys in the corpus.
+    :param length: an integer representing the bit-length of the primes.
+    :param ratio: a float representing the fraction of vulnerable keys.
+    :param processes: an integer representing the size of the pool, by default the number of cores.
+    :return: a float representing the throughput, in keys audited per second.
+    """
+
+    with tempfile.TemporaryDirectory() as directory:
+        corpus = os.path.join(directory, "keys.jsonl")
+        with open(corpus, "w") as f:
+            for i in range(size):
+                p, q = interval_search(length, bpsw), interval_search(length, bpsw)
+                phi = (p - 1) * (q - 1)
+                if random.random() < ratio:
+                    # A secret key shorter than N^(1/4) / 3 is always recovered.
+                    e = 0
+                    while e == 0:
+                        d = random.getrandbits(length // 2 - 2) | 1
+                        e = pow(d, -1, phi) if math.gcd(d, phi) == 1 else 0
+                else:
+                    # A small public exponent leaves a secret key as large as N.
+                    e = 65537
+                f.write(json.dumps({"id": i, "N": p * q, "e": e}) + "\n")
+
+        start = time.perf_counter()
+        audited, vulnerable = audit(corpus, os.path.join(directory, "report.jsonl"), processes, progress=None)
+        rate = audited / (time.perf_counter() - start)
+    print("{} keys audited, {} vulnerable, {:.1f} keys per second".format(audited, vulnerable, rate))
+    return rate
 
 
 if __name__ == '__main__':
+    if len(sys.argv) == 3:
+        # python wiener.py corpus.jsonl report.jsonl
+        audit(sys.argv[1], sys.argv[2])
+        sys.exit()
+
     N = 194749497518847283
     e = 50736902528669041
     C = [47406263192693509, 51065178201172223, 30260565235128704, 82385963334404268,
@@ -113,5 +279,6 @@ if __name__ == '__main__':
     if D is None:
         print("The attack has failed!")
     else:
+        context = FixedExponent(D, N)
         for i in range(len(C)):
-            print(chr(fast(C[i], D, N)), end="")
+            print(chr(context.exp(C[i])), end="")